@@ -13,13 +13,16 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                              QTextEdit, QDockWidget, QFileDialog, QDialog, QCheckBox, QFormLayout, QFileIconProvider,
                              QToolButton, QDialogButtonBox, QScrollArea, QRadioButton, QMessageBox, QProgressBar)
 from PyQt5.QtGui import QIcon, QPixmap, QColor
-from PyQt5.QtCore import Qt, QDateTime, QFileInfo, QSize, pyqtSignal, QMetaObject, pyqtSlot
+from PyQt5.QtCore import Qt, QDateTime, QFileInfo, QSize, QTimer, pyqtSignal, QMetaObject, pyqtSlot
 from pynput.keyboard import Controller as KeyboardController, Key
 
 from definitions import CONTROL_DEFINITIONS
 from controls import JoystickManager, BindingsEditor
 from web_interface import OpenRailsWebInterface
 from hid_manager import SaitekPanelManager
+from binding_model import parse_binding_attrib, EMPTY_CONTROL
+from input_router import InputRouter
+from input_thread import InputThread
 
 # --- HELPER FUNCTION TO FIND FILES WHEN COMPILED ---
 def resource_path(relative_path):
@@ -470,9 +473,9 @@ class MainAppWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("OpenRailsLink"); self.setGeometry(100, 100, 1920, 900); self.setStyleSheet(STYLE_SHEET)
         self.bindings = {}; self.gui_controls = {}; self.gui_labels = {}; self.config = {}
-        self.current_profile_path = None; self.active_cab_controls = []
-        self.slider_last_values = {}
-        self.joystick_manager = JoystickManager(self); self.saitek_manager = SaitekPanelManager(self); self.web_interface = OpenRailsWebInterface(self)
+        self.current_profile_path = None; self.input_thread = None
+        self.joystick_manager = JoystickManager(self); self.saitek_manager = SaitekPanelManager(self, resource_path("panels")); self.web_interface = OpenRailsWebInterface(self)
+        self.input_router = InputRouter(self.web_interface, log=self.log_message); self.input_router.workaround_handler = self.run_keyboard_workaround
         self.launcher_editor = LauncherEditor(self)
         self.keyboard_controller = KeyboardController()
         self.held_keys = {}  # Track which keys are currently held down
@@ -502,6 +505,13 @@ class MainAppWindow(QMainWindow):
         
         # --- FIXED INITIALIZATION ORDER: Load config BEFORE UI ---
         self.load_app_config()  # ← Load config FIRST
+        self.joystick_manager.set_backend(self.config.get("settings", {}).get("joystick_backend", "poll"))
+        self.joystick_manager.axis_threshold = float(self.config.get("settings", {}).get("axis_threshold", self.joystick_manager.axis_threshold))
+        settings = self.config.get("settings", {})
+        self.web_interface.configure_sending(settings.get("value_flush_hz", 60), settings.get("value_flush_delta", 0.1), settings.get("click_press_ms", 50), settings.get("click_gap_ms", 20),
+                                              settings.get("value_epsilon", 0.0005), settings.get("value_refresh_s", 0.0))
+        self.web_interface.configure_lanes(settings.get("command_lanes", {}))
+        self.saitek_manager.configure_debounce(settings.get("hid_debounce_ms", {}))
         
         # Update loading screen if it exists
         if hasattr(QApplication.instance(), 'activeModalWidget'):
@@ -517,6 +527,9 @@ class MainAppWindow(QMainWindow):
                 modal.update_progress(60, "Connecting signals...")
         
         self.connect_signals()
+        self.input_router.register_virtual_handlers(self.build_virtual_handlers())
+        for control_id in self.input_router.missing_virtual_handlers(): self.log_message(f"No handler registered for virtual control {control_id}", "ERROR")
+        if self.config.get("settings", {}).get("input_thread", False): self.start_input_thread()
         self.update_extra_camera_visibility()
         
         if hasattr(QApplication.instance(), 'activeModalWidget'):
@@ -541,8 +554,9 @@ class MainAppWindow(QMainWindow):
         self.trackir_game_check_timer.timeout.connect(self.check_trackir_game_status)
         self.trackir_game_check_timer.start(5000)  # Check every 5 seconds
 
-        if self.saitek_manager.is_connected(): 
-            self.log_message("Found Saitek Switch Panel.", "APP")
+        for error in self.saitek_manager.load_errors: self.log_message(f"Skipped HID panel definition {error}", "ERROR")
+        for panel in self.saitek_manager.connected_panels(): self.log_message(f"Found {panel.name}.", "APP")
+        self.saitek_manager.start_monitor()
         self.web_interface.start()
 
         # Load profile (command-line arg takes priority, then default from config)
@@ -915,10 +929,15 @@ class MainAppWindow(QMainWindow):
         self.trackir_address_invalid.connect(self.on_trackir_address_invalid)
         self.web_interface.connection_status_changed.connect(self.on_connection_status_changed)
         self.web_interface.cab_controls_updated.connect(self.on_cab_controls_updated)
+        self.web_interface.cab_values_received.connect(lambda server_data: self.route(self.input_router.on_cab_values, server_data))
         self.web_interface.command_sent.connect(lambda p, c, v: self.log_message(f"{c} = {v}", f"SENT-{p}"))
         self.web_interface.update_received.connect(lambda data: self.log_message(data, "RECV"))
-        self.joystick_manager.raw_joystick_event.connect(self.process_raw_joystick_input)
-        self.saitek_manager.saitek_event.connect(self.process_saitek_input)
+        self.joystick_manager.raw_joystick_batch.connect(self.process_raw_joystick_batch)
+        self.saitek_manager.saitek_changes.connect(self.process_saitek_input)
+        self.joystick_manager.devices_changed.connect(self.populate_device_list)
+        self.saitek_manager.devices_changed.connect(self.populate_device_list)
+        self.input_router.observers.append(self.on_router_state_changed)
+        self.combined_throttle_cb.toggled.connect(lambda checked: self.route(self.input_router.set_combined_mode, checked)); self.invert_combined_cb.toggled.connect(lambda checked: self.route(self.input_router.set_invert_combined, checked))
         self.launcher_editor.profiles_changed.connect(self.rebuild_launcher_buttons)
         self.log_message("All signals connected successfully", "APP")
 
@@ -1015,521 +1034,277 @@ class MainAppWindow(QMainWindow):
     def on_connection_status_changed(self, is_connected, server_data):
         if is_connected:
             self.status_label.setText("CONNECTED"); self.status_label.setObjectName("status_label_ok"); self.log_message("Connection established.", "APP")
-            server_active_button_ids = set(server_data); self.gui_controls['COMBINED_THROTTLE'].setEnabled(True)
-            for our_id, definition in CONTROL_DEFINITIONS.items():
-                widget = self.gui_controls.get(our_id)
-                if not widget or our_id == 'COMBINED_THROTTLE' or definition.get('behavior') == 'virtual': continue
-                if our_id in ['HORN', 'BELL']: widget.setEnabled(True); continue
-                if 'id' in definition:
-                    command_id = definition.get('id')
-                    is_active = any(sub_id in server_active_button_ids for sub_id in command_id) if isinstance(command_id, list) else command_id in server_active_button_ids
-                    widget.setEnabled(is_active)
+            self.route(self.input_router.on_connection_changed, True, list(server_data))
         else:
             self.status_label.setText("DISCONNECTED"); self.status_label.setObjectName("status_label_fail")
             error_msg = server_data[0] if isinstance(server_data, list) and server_data else "Connection lost."
             self.log_message(f"Connection failed or lost: {error_msg}", "APP")
-            for widget in self.gui_controls.values(): widget.setEnabled(False)
+            self.route(self.input_router.on_connection_changed, False, [])
         self.status_label.style().unpolish(self.status_label); self.status_label.style().polish(self.status_label)
     
     def on_cab_controls_updated(self, server_data):
-        self.active_cab_controls = server_data
-        if not server_data: return
-        active_slider_names = {control['TypeName'] for control in server_data}
-        for control_id, definition in CONTROL_DEFINITIONS.items():
-            if definition.get('type') != 'slider' or 'id' in definition: continue
-            widget = self.gui_controls.get(control_id); label = self.gui_labels.get(control_id)
-            if not widget or not label: continue
-            if control_id in active_slider_names:
-                widget.setEnabled(True); control_data = next((c for c in server_data if c['TypeName'] == control_id), None)
-                if control_data:
-                    min_val_f, max_val_f = control_data['MinValue'], control_data['MaxValue']
-                    if max_val_f == 1.0 and min_val_f == 0.0: widget.setRange(0, 100); label.setText(f"<b>{definition['desc']}</b> (0-100)")
-                    else:
-                        min_val, max_val = int(min_val_f), int(max_val_f); widget.setRange(min_val, max_val); label.setText(f"<b>{definition['desc']}</b> ({min_val}-{max_val})")
-            else: widget.setEnabled(False)
-
-    def process_raw_joystick_input(self, joy_id, type, index, value):
-        if type == 'axis':
-            percentage = ((value + 1) / 2.0) * 100; at_max = "⚠ AT MAX" if abs(value) >= 0.95 else ""
-            bound_to = "UNBOUND"
-            for control_id, bindings in self.bindings.items():
-                axis_binding = bindings.get('axis')
-                if axis_binding:
-                    if isinstance(axis_binding, list): axis_binding = axis_binding[0]
-                    if (axis_binding.get('joy_id') == joy_id and axis_binding.get('index') == index): bound_to = control_id; break
-            self.log_message(f"[AXIS RAW] Joy{joy_id} Axis{index} → {bound_to}: Raw={value:.6f} ({percentage:.2f}%) {at_max}", "DEBUG")
-        if type == 'axis':
-            last_value_key = f"joy{joy_id}_axis{index}"; last_value = getattr(self, '_last_axis_values', {}).get(last_value_key, 0.0)
-            if abs(value - last_value) < 0.01: return
-            if not hasattr(self, '_last_axis_values'): self._last_axis_values = {}
-            self._last_axis_values[last_value_key] = value
-        if type == 'button':
-            if not hasattr(self, '_button_states'): self._button_states = {}
-            button_key = f"joy{joy_id}_btn{index}"; old_state = self._button_states.get(button_key, 0.0); self._button_states[button_key] = value
-            if old_state == 1.0 and value == 0.0:
-                for control_id, control_bindings in self.bindings.items():
-                    # Check if ANY button binding for this control has override='toggle_on_press'
-                    skip_release = False
-                    button_bindings = control_bindings.get('button', [])
-                    if not isinstance(button_bindings, list): button_bindings = [button_bindings]
-                    
-                    for b in button_bindings:
-                        if (isinstance(b, dict) and 
-                            b.get('device_type') == 'joystick' and 
-                            b.get('joy_id') == joy_id and 
-                            b.get('index') == index and 
-                            b.get('override') == 'toggle_on_press'):
-                            skip_release = True
-                            self.log_message(f"Ignoring button release for {control_id} due to toggle_on_press override", "BINDING")
-                            break
-                    
-                    if skip_release:
-                        continue
-                    
-                    # WORKAROUND HOLD: Process release events for workaround controls
-                    use_workaround = control_bindings.get("use_workaround", False)
-                    if use_workaround:
-                        button_bindings = control_bindings.get('button', [])
-                        if not isinstance(button_bindings, list): button_bindings = [button_bindings]
-                        
-                        for b in button_bindings:
-                            if (isinstance(b, dict) and 
-                                b.get('device_type') == 'joystick' and 
-                                b.get('joy_id') == joy_id and 
-                                b.get('index') == index):
-                                # Send release event to workaround
-                                self.execute_binding(control_id, 'button', 0.0)
-                                break
-                    
-                    # Process off_button bindings normally
-                    off_button_bindings = control_bindings.get('off_button', [])
-                    if not isinstance(off_button_bindings, list): off_button_bindings = [off_button_bindings]
-                        
-                    for binding in off_button_bindings:
-                        if (isinstance(binding, dict) and binding.get('device_type') == 'joystick' and binding.get('joy_id') == joy_id and binding.get('index') == index):
-                            self.execute_binding(control_id, 'off_button', 0.0); self.log_message(f"Switch OFF detected: {control_id}", "BINDING")
-                    values_dict = control_bindings.get('values', {})
-                    for step_value, binding_list in values_dict.items():
-                        bindings = binding_list if isinstance(binding_list, list) else [binding_list]
-                        for binding in bindings:
-                            if (isinstance(binding, dict) and binding.get('device_type') == 'joystick' and binding.get('joy_id') == joy_id and binding.get('index') == index):
-                                self.release_step_binding(control_id, step_value); break
-        if type == 'button' and value == 1.0:
-            virtual_controls = ["TOGGLE_COMBINED_THROTTLE", "TOGGLE_INVERT_COMBINED", "TOGGLE_TRACKIR", "SCAN_CAB_CAMERA", "SCAN_EXTERNAL_CAMERA", "SCAN_INTERIOR_CAMERA", "RESCAN_CAB_CAMERA", "RESCAN_EXTERNAL_CAMERA", "RESCAN_INTERIOR_CAMERA", "START_CAB_WRITER", "STOP_CAB_WRITER", "START_EXTERNAL_WRITER", "STOP_EXTERNAL_WRITER", "START_INTERIOR_WRITER", "STOP_INTERIOR_WRITER", "COMBINED_THROTTLE"]
-            for control_id in virtual_controls:
-                control_bindings = self.bindings.get(control_id, {}); button_bindings = control_bindings.get('button', [])
-                if not isinstance(button_bindings, list): button_bindings = [button_bindings]
-                for binding in button_bindings:
-                    if (isinstance(binding, dict) and binding.get('device_type') == 'joystick' and binding.get('joy_id') == joy_id and binding.get('index') == index):
-                        self.log_message(f"Virtual control button detected: {control_id} from Joy{joy_id} Btn{index}", "BINDING"); self.execute_binding(control_id, 'button', 1.0); return
-        if self.combined_throttle_cb.isChecked():
-            binding = self.bindings.get("COMBINED_THROTTLE", {}).get("axis")
-            if binding and binding.get('joy_id') == joy_id and binding.get('index') == index and type == 'axis':
-                active_slider_names = {c['TypeName'] for c in self.active_cab_controls}; brake_type = "TRAIN_BRAKE" 
-                if 'DYNAMIC_BRAKE' in active_slider_names and 'TRAIN_BRAKE' not in active_slider_names: brake_type = 'DYNAMIC_BRAKE'
-                if binding.get("inverted", False): value = -value
-                if self.invert_combined_cb.isChecked(): value = -value
-                self.handle_combined_brake_logic(brake_type, value); return 
-        for control_id, control_bindings in self.bindings.items():
-            if 'values' in control_bindings and type == 'button' and value == 1.0:
-                for step_value, binding_list in control_bindings['values'].items():
-                    bindings = binding_list if isinstance(binding_list, list) else [binding_list]
-                    for binding_data in bindings:
-                        if binding_data.get('device_type') == 'joystick' and binding_data.get('joy_id') == joy_id and binding_data.get('index') == index:
-                            self.log_message(f"Button {index} pressed → {control_id} step {step_value}", "DEBUG")
-                            self.execute_step_binding(control_id, step_value)
-                            return
-            for binding_type, binding_data in control_bindings.items():
-                if binding_type in ['values', 'use_workaround', 'incremental_mode', 'binding_behavior_override']: continue
-                bindings = binding_data if isinstance(binding_data, list) else [binding_data]
-                for binding in bindings:
-                    if not isinstance(binding, dict): continue
-                    if binding.get('device_type') == 'joystick' and binding.get('joy_id') == joy_id and binding.get('index') == index:
-                        override = binding.get('override')
-                        if (binding_type == 'axis' and type == 'axis') or (binding_type != 'axis' and type == 'button'): 
-                            self.execute_binding(control_id, binding_type, value, override)
-                        
-    def process_saitek_input(self, switch, state):
-        if not hasattr(self, '_saitek_switch_states'): 
-            self._saitek_switch_states = {}
-        
-        old_state = self._saitek_switch_states.get(switch)
-        self._saitek_switch_states[switch] = state
-        
-        # Log the raw input
-        self.log_message(f"🎛️ Saitek: {switch} → {state}", "SAITEK")
-        
-        for control_id, control_bindings in self.bindings.items():
-            # Handle stepped values (3-way switches, etc.)
-            if 'values' in control_bindings and state == "ON":
-                for step_value, binding_list in control_bindings['values'].items():
-                    bindings = binding_list if isinstance(binding_list, list) else [binding_list]
-                    for binding_data in bindings:
-                        if (binding_data.get('device_type') == 'saitek' and 
-                            binding_data.get('switch') == switch):
-                            self.log_message(f"  ✓ Matched stepped binding: {control_id} step={step_value}", "SAITEK")
-                            self.execute_step_binding(control_id, step_value)
-                            return
-            
-            # Handle regular bindings - SIMPLE like old version
-            for binding_type, binding_data in control_bindings.items():
-                if binding_type in ['values', 'use_workaround', 'incremental_mode']: 
-                    continue
-                
-                bindings = binding_data if isinstance(binding_data, list) else [binding_data]
-                
-                for binding in bindings:
-                    if not isinstance(binding, dict): 
-                        continue
-                    
-                    # Check if this binding matches the Saitek input
-                    if binding.get('device_type') == 'saitek' and binding.get('switch') == switch:
-                        expected_state = binding.get('state')
-                        
-                        # Log what we're checking
-                        self.log_message(
-                            f"  🔍 Checking {control_id}.{binding_type}: "
-                            f"expected_state={expected_state}, actual_state={state}, "
-                            f"match={expected_state == state}", 
-                            "SAITEK"
-                        )
-                        
-                        # Only execute if state matches
-                        if expected_state == state:
-                            # For Saitek switches, always pass the correct value based on state
-                            # ON = 1.0, OFF = 0.0 (even for off_button bindings)
-                            value_to_send = 1.0 if state == "ON" else 0.0
-                            self.log_message(f"  ✓ Executing: {control_id}.{binding_type} with value={value_to_send}", "SAITEK")
-                            self.execute_binding(control_id, binding_type, value_to_send)
-                        else:
-                            self.log_message(f"  ✗ Skipped (state mismatch)", "SAITEK")
+        self.route(self.input_router.on_cab_controls, server_data)
+
+    def build_virtual_handlers(self):
+        """Handlers for the 'virtual' controls that drive this window rather than Open Rails, as handler(binding_type, value, control)"""
+        def on_press(action, *args):
+            def handler(binding_type, value, control):
+                if value == 1.0: action(*args)
+            return handler
+        def trackir_toggle(binding_type, value, control):
+            # For toggle buttons: only respond to press (value=1.0), ignore release unless separate off_button exists
+            if binding_type == "button" and value == 1.0: self.stop_trackir_writer() if self.trackir_writer_process else self.start_trackir_writer()
+            elif binding_type == "off_button" and value == 0.0: self.stop_trackir_writer()
+        return {
+            "TOGGLE_TRACKIR": trackir_toggle,
+            "START_CAB_WRITER": on_press(self.start_individual_camera_writer, 'cab'), "STOP_CAB_WRITER": on_press(self.stop_individual_camera_writer, 'cab'),
+            "START_EXTERNAL_WRITER": on_press(self.start_individual_camera_writer, 'external'), "STOP_EXTERNAL_WRITER": on_press(self.stop_individual_camera_writer, 'external'),
+            "START_INTERIOR_WRITER": on_press(self.start_individual_camera_writer, 'interior'), "STOP_INTERIOR_WRITER": on_press(self.stop_individual_camera_writer, 'interior'),
+            "SCAN_CAB_CAMERA": on_press(self.start_camera_scan, 'cab'), "SCAN_EXTERNAL_CAMERA": on_press(self.start_camera_scan, 'external'), "SCAN_INTERIOR_CAMERA": on_press(self.start_camera_scan, 'interior'),
+            "RESCAN_CAB_CAMERA": on_press(self.restart_camera_scan, 'cab'), "RESCAN_EXTERNAL_CAMERA": on_press(self.restart_camera_scan, 'external'), "RESCAN_INTERIOR_CAMERA": on_press(self.restart_camera_scan, 'interior'),
+        }
 
-    def execute_binding(self, control_id, binding_type, value, override=None):
-        control_bindings = self.bindings.get(control_id, {}); use_workaround = control_bindings.get("use_workaround", False)
-        
-        # Add logging for workaround detection
-        if use_workaround and value >= 0.0:  # Changed: process both press (1.0) and release (0.0)
-            self.log_message(f"⚙ Workaround triggered for {control_id}, value={value}, binding_type={binding_type}", "WORKAROUND")
-            try:
-                import win32gui
-                hwnd = win32gui.GetForegroundWindow()
-                window_text = win32gui.GetWindowText(hwnd)
-                
-                # Only log window check on initial press to reduce spam
+    def rebuild_binding_index(self):
+        """Hand the current bindings to the input router, which rebuilds its model and lookup tables"""
+        self.route(self.input_router.set_bindings, self.bindings)
+
+    def route(self, fn, *args):
+        """Call into the input router on the thread that owns it"""
+        if self.input_thread: self.input_thread.post(fn, *args)
+        else: fn(*args)
+
+    def start_input_thread(self):
+        """Move joystick polling and binding dispatch off the GUI thread (settings.input_thread)"""
+        # SDL may only pump events on the thread that initialised it, so the input thread takes pygame over for its lifetime
+        thread = InputThread(self.input_router, self.poll_joysticks_threaded, setup=self.joystick_manager.adopt_thread, teardown=self.joystick_manager.release_thread)
+        # Keyboard emulation and the window's virtual controls touch widgets, so they still run on the GUI thread
+        self.input_router.workaround_handler = thread.in_gui(self.run_keyboard_workaround)
+        self.input_router.register_virtual_handlers({control_id: thread.in_gui(handler) for control_id, handler in self.build_virtual_handlers().items()})
+        self.joystick_manager.threaded = True; self.joystick_manager.poll_timer.stop()
+        self.joystick_manager.raw_joystick_batch.disconnect(self.process_raw_joystick_batch)
+        # Saitek reports already arrive on the HID reader thread: hand them straight to the input thread
+        self.saitek_manager.saitek_changes.disconnect(self.process_saitek_input); self.saitek_manager.saitek_changes.connect(self.process_saitek_input, Qt.DirectConnection)
+        self.input_thread = thread
+        self.input_drain_timer = QTimer(self); self.input_drain_timer.timeout.connect(self.drain_input_thread); self.input_drain_timer.start(16)
+        thread.start(); self.log_message("Input thread started - devices are polled and dispatched off the GUI thread", "APP")
+
+    def poll_joysticks_threaded(self):
+        events = self.joystick_manager.poll()
+        # Only the bindings editor and axis dialogs still listen to the signal in threaded mode
+        if events and self.joystick_manager.receivers(self.joystick_manager.raw_joystick_event) > 0:
+            for event in events: self.joystick_manager.raw_joystick_event.emit(*event[:4])
+        return events
+
+    def drain_input_thread(self):
+        """Once per frame: apply what the input thread queued for the GUI"""
+        items, calls, overflowed = self.input_thread.drain_ui()
+        for item in items:
+            if item[0] == 'state': self.on_router_state_changed(*item[1:])
+            else: self.log_message(*item[1:])
+        for fn, args in calls: fn(*args)
+        if overflowed: self.log_message("Input queue overflowed - resyncing controls from the router", "APP"); self.route(self.snapshot_router)
+
+    def snapshot_router(self):
+        """On the router's thread: copy the state the widgets mirror and hand it to resync_from_router on the GUI thread"""
+        router = self.input_router
+        snapshot = (set(router.enabled), dict(router.values), dict(router.checked), dict(router.ranges), {name: getattr(router, name) for name in ('combined_mode', 'invert_combined')})
+        if self.input_thread: self.input_thread.in_gui(self.resync_from_router)(*snapshot)
+        else: self.resync_from_router(*snapshot)
+
+    def resync_from_router(self, enabled, values, checked, ranges, settings):
+        for control_id, widget in self.gui_controls.items():
+            widget.setEnabled(control_id in enabled)
+            definition = CONTROL_DEFINITIONS.get(control_id, {})
+            if definition.get('type') == 'slider' and 'id' not in definition and control_id in ranges: self.on_router_state_changed('range', control_id, ranges[control_id])
+            if control_id in values: self.on_router_state_changed('value', control_id, values[control_id])
+            elif control_id in checked: self.on_router_state_changed('checked', control_id, checked[control_id])
+        for name, is_on in settings.items(): self.on_router_state_changed('setting', name, is_on)
+
+    def on_router_state_changed(self, kind, control_id, value):
+        """Mirror InputRouter state into the widgets without feeding it back through their signals"""
+        if kind == 'setting':
+            checkbox = {'combined_mode': self.combined_throttle_cb, 'invert_combined': self.invert_combined_cb}.get(control_id)
+            if checkbox: checkbox.blockSignals(True); checkbox.setChecked(value); checkbox.blockSignals(False)
+            return
+        widget = self.gui_controls.get(control_id)
+        if not widget: return
+        if kind == 'enabled': widget.setEnabled(value)
+        elif kind == 'range':
+            widget.blockSignals(True); widget.setRange(*value); widget.blockSignals(False)
+            label = self.gui_labels.get(control_id)
+            if label: label.setText(f"<b>{CONTROL_DEFINITIONS[control_id]['desc']}</b> ({value[0]}-{value[1]})")
+        elif kind == 'value': widget.blockSignals(True); widget.setValue(value); widget.blockSignals(False)
+        elif kind == 'checked': widget.blockSignals(True); widget.setChecked(value); widget.blockSignals(False)
+
+    def process_raw_joystick_batch(self, events):
+        self.input_router.handle_joystick_events(events)
+
+    def process_saitek_input(self, timestamp, changes):
+        self.route(self.input_router.handle_saitek_changes, timestamp, changes)
+
+    def run_keyboard_workaround(self, control_id, binding_type, value, control):
+        """Press/release the keyboard bindings of a 'use_workaround' control while the game window has focus"""
+        self.log_message(f"⚙ Workaround triggered for {control_id}, value={value}, binding_type={binding_type}", "WORKAROUND")
+        try:
+            import win32gui
+            hwnd = win32gui.GetForegroundWindow()
+            window_text = win32gui.GetWindowText(hwnd)
+            
+            # Only log window check on initial press to reduce spam
+            if value == 1.0:
+                self.log_message(f"🖥 Foreground window: '{window_text}'", "WORKAROUND")
+            
+            if "RunActivity" in window_text or "Open Rails" in window_text:
                 if value == 1.0:
-                    self.log_message(f"🖥 Foreground window: '{window_text}'", "WORKAROUND")
+                    self.log_message(f"✔ Game window is focused - proceeding with workaround", "WORKAROUND")
                 
-                if "RunActivity" in window_text or "Open Rails" in window_text:
+                # Keyboard bindings for this control, collected when the model was built
+                keyboard_bindings = control.keyboard
+                
+                if keyboard_bindings:
                     if value == 1.0:
-                        self.log_message(f"✔ Game window is focused - proceeding with workaround", "WORKAROUND")
-                    
-                    # Collect all keyboard bindings for this control
-                    keyboard_bindings = []
-                    for key in ['button', 'off_button', 'increase', 'decrease']:
-                        bindings = control_bindings.get(key, [])
-                        if not isinstance(bindings, list):
-                            bindings = [bindings]
-                        for b in bindings:
-                            if isinstance(b, dict) and b.get('device_type') == 'keyboard':
-                                keyboard_bindings.append(b)
+                        self.log_message(f"⌨ Found {len(keyboard_bindings)} keyboard binding(s)", "WORKAROUND")
                     
-                    if keyboard_bindings:
-                        if value == 1.0:
-                            self.log_message(f"⌨ Found {len(keyboard_bindings)} keyboard binding(s)", "WORKAROUND")
+                    for kb_binding in keyboard_bindings:
+                        key_str = kb_binding.key
                         
-                        for kb_binding in keyboard_bindings:
-                            key_str = kb_binding.get('key', '')
-                            if not key_str:
-                                continue
-                            
-                            # Create unique key for tracking this binding
-                            tracking_key = f"{control_id}_{key_str}"
-                            
-                            try:
-                                # PRESS EVENT (value == 1.0)
-                                if value == 1.0:
-                                    self.log_message(f"⇨ Pressing and HOLDING key: '{key_str}'", "WORKAROUND")
+                        # Create unique key for tracking this binding
+                        tracking_key = f"{control_id}_{key_str}"
+                        
+                        try:
+                            # PRESS EVENT (value == 1.0)
+                            if value == 1.0:
+                                self.log_message(f"⇨ Pressing and HOLDING key: '{key_str}'", "WORKAROUND")
+                                
+                                # Handle modifier combinations (e.g., "ctrl_shift_a")
+                                if '_' in key_str:
+                                    parts = key_str.split('_')
+                                    self.log_message(f"  Parsing key combo: {parts}", "WORKAROUND")
                                     
-                                    # Handle modifier combinations (e.g., "ctrl_shift_a")
-                                    if '_' in key_str:
-                                        parts = key_str.split('_')
-                                        self.log_message(f"  Parsing key combo: {parts}", "WORKAROUND")
-                                        
-                                        modifiers = []
-                                        main_key = parts[-1]
-                                        
-                                        for part in parts[:-1]:
-                                            if part == 'ctrl':
-                                                modifiers.append(Key.ctrl)
-                                            elif part == 'shift':
-                                                modifiers.append(Key.shift)
-                                            elif part == 'alt':
-                                                modifiers.append(Key.alt)
-                                            elif part == 'win':
-                                                modifiers.append(Key.cmd)
-                                        
-                                        # Press and HOLD modifiers
-                                        for mod in modifiers:
-                                            self.keyboard_controller.press(mod)
-                                        
-                                        # Press and HOLD main key
-                                        self.keyboard_controller.press(main_key)
-                                        
-                                        # Store what we pressed so we can release it later
-                                        self.held_keys[tracking_key] = {
-                                            'modifiers': modifiers,
-                                            'main_key': main_key,
-                                            'is_combo': True
-                                        }
-                                        
-                                        self.log_message(f"  ✔ Hotkey combo HELD", "WORKAROUND")
+                                    modifiers = []
+                                    main_key = parts[-1]
                                     
-                                    else:
-                                        # Single key - press and HOLD
-                                        self.log_message(f"  Pressing and holding: '{key_str}'", "WORKAROUND")
-                                        
-                                        # Try to map to Key enum first
-                                        try:
-                                            if hasattr(Key, key_str):
-                                                key_obj = getattr(Key, key_str)
-                                                self.keyboard_controller.press(key_obj)
-                                                self.held_keys[tracking_key] = {
-                                                    'key': key_obj,
-                                                    'is_combo': False
-                                                }
-                                            else:
-                                                # Regular character key (including "/")
-                                                self.keyboard_controller.press(key_str)
-                                                self.held_keys[tracking_key] = {
-                                                    'key': key_str,
-                                                    'is_combo': False
-                                                }
-                                            
-                                            self.log_message(f"  ✔ Key '{key_str}' HELD DOWN", "WORKAROUND")
-                                        
-                                        except Exception as key_error:
-                                            self.log_message(f"  ✗ Key mapping error: {key_error}", "ERROR")
-                                            # Fallback
+                                    for part in parts[:-1]:
+                                        if part == 'ctrl':
+                                            modifiers.append(Key.ctrl)
+                                        elif part == 'shift':
+                                            modifiers.append(Key.shift)
+                                        elif part == 'alt':
+                                            modifiers.append(Key.alt)
+                                        elif part == 'win':
+                                            modifiers.append(Key.cmd)
+                                    
+                                    # Press and HOLD modifiers
+                                    for mod in modifiers:
+                                        self.keyboard_controller.press(mod)
+                                    
+                                    # Press and HOLD main key
+                                    self.keyboard_controller.press(main_key)
+                                    
+                                    # Store what we pressed so we can release it later
+                                    self.held_keys[tracking_key] = {
+                                        'modifiers': modifiers,
+                                        'main_key': main_key,
+                                        'is_combo': True
+                                    }
+                                    
+                                    self.log_message(f"  ✔ Hotkey combo HELD", "WORKAROUND")
+                                
+                                else:
+                                    # Single key - press and HOLD
+                                    self.log_message(f"  Pressing and holding: '{key_str}'", "WORKAROUND")
+                                    
+                                    # Try to map to Key enum first
+                                    try:
+                                        if hasattr(Key, key_str):
+                                            key_obj = getattr(Key, key_str)
+                                            self.keyboard_controller.press(key_obj)
+                                            self.held_keys[tracking_key] = {
+                                                'key': key_obj,
+                                                'is_combo': False
+                                            }
+                                        else:
+                                            # Regular character key (including "/")
                                             self.keyboard_controller.press(key_str)
                                             self.held_keys[tracking_key] = {
                                                 'key': key_str,
                                                 'is_combo': False
                                             }
-                                    
-                                    # SUCCESS - mark this control as having held keys
-                                    return
-                                
-                                # RELEASE EVENT (value == 0.0)
-                                elif value == 0.0:
-                                    self.log_message(f"⇧ Releasing key: '{key_str}'", "WORKAROUND")
-                                    
-                                    if tracking_key in self.held_keys:
-                                        held_data = self.held_keys[tracking_key]
-                                        
-                                        if held_data['is_combo']:
-                                            # Release combo (reverse order)
-                                            self.keyboard_controller.release(held_data['main_key'])
-                                            for mod in reversed(held_data['modifiers']):
-                                                self.keyboard_controller.release(mod)
-                                            self.log_message(f"  ✔ Hotkey combo RELEASED", "WORKAROUND")
-                                        else:
-                                            # Release single key
-                                            self.keyboard_controller.release(held_data['key'])
-                                            self.log_message(f"  ✔ Key '{key_str}' RELEASED", "WORKAROUND")
                                         
-                                        # Remove from tracking
-                                        del self.held_keys[tracking_key]
-                                    else:
-                                        self.log_message(f"  ⚠ Key '{key_str}' was not held (already released?)", "WORKAROUND")
+                                        self.log_message(f"  ✔ Key '{key_str}' HELD DOWN", "WORKAROUND")
                                     
-                                    return
+                                    except Exception as key_error:
+                                        self.log_message(f"  ✗ Key mapping error: {key_error}", "ERROR")
+                                        # Fallback
+                                        self.keyboard_controller.press(key_str)
+                                        self.held_keys[tracking_key] = {
+                                            'key': key_str,
+                                            'is_combo': False
+                                        }
                                 
-                            except Exception as e:
-                                self.log_message(f"  ✗ Keyboard emulation error: {e}", "ERROR")
-                                import traceback
-                                self.log_message(f"  Stack trace: {traceback.format_exc()}", "ERROR")
+                                # SUCCESS - mark this control as having held keys
+                                return
+                            
+                            # RELEASE EVENT (value == 0.0)
+                            elif value == 0.0:
+                                self.log_message(f"⇧ Releasing key: '{key_str}'", "WORKAROUND")
                                 
-                                # Clean up on error
                                 if tracking_key in self.held_keys:
+                                    held_data = self.held_keys[tracking_key]
+                                    
+                                    if held_data['is_combo']:
+                                        # Release combo (reverse order)
+                                        self.keyboard_controller.release(held_data['main_key'])
+                                        for mod in reversed(held_data['modifiers']):
+                                            self.keyboard_controller.release(mod)
+                                        self.log_message(f"  ✔ Hotkey combo RELEASED", "WORKAROUND")
+                                    else:
+                                        # Release single key
+                                        self.keyboard_controller.release(held_data['key'])
+                                        self.log_message(f"  ✔ Key '{key_str}' RELEASED", "WORKAROUND")
+                                    
+                                    # Remove from tracking
                                     del self.held_keys[tracking_key]
-                                continue
-                        
-                        # If we get here, no bindings succeeded
-                        if value == 1.0:
-                            self.log_message(f"✗ All keyboard bindings failed", "ERROR")
-                        return
-                    else:
-                        if value == 1.0:
-                            self.log_message(f"⚠ No keyboard bindings configured for {control_id}", "WORKAROUND")
-                        return
+                                else:
+                                    self.log_message(f"  ⚠ Key '{key_str}' was not held (already released?)", "WORKAROUND")
+                                
+                                return
+                            
+                        except Exception as e:
+                            self.log_message(f"  ✗ Keyboard emulation error: {e}", "ERROR")
+                            import traceback
+                            self.log_message(f"  Stack trace: {traceback.format_exc()}", "ERROR")
+                            
+                            # Clean up on error
+                            if tracking_key in self.held_keys:
+                                del self.held_keys[tracking_key]
+                            continue
+                    
+                    # If we get here, no bindings succeeded
+                    if value == 1.0:
+                        self.log_message(f"✗ All keyboard bindings failed", "ERROR")
+                    return
                 else:
                     if value == 1.0:
-                        self.log_message(f"✗ Game window not focused ('{window_text}') - workaround skipped", "WORKAROUND")
+                        self.log_message(f"⚠ No keyboard bindings configured for {control_id}", "WORKAROUND")
                     return
-                    
-            except Exception as e:
-                self.log_message(f"⚠ Workaround system error: {e}", "ERROR")
-                import traceback
-                self.log_message(f"Stack trace: {traceback.format_exc()}", "ERROR")
+            else:
+                if value == 1.0:
+                    self.log_message(f"✗ Game window not focused ('{window_text}') - workaround skipped", "WORKAROUND")
                 return
-        virtual_controls = ["TOGGLE_COMBINED_THROTTLE", "TOGGLE_INVERT_COMBINED", "TOGGLE_TRACKIR", "SCAN_CAB_CAMERA", "SCAN_EXTERNAL_CAMERA", "SCAN_INTERIOR_CAMERA", "RESCAN_CAB_CAMERA", "RESCAN_EXTERNAL_CAMERA", "RESCAN_INTERIOR_CAMERA", "START_CAB_WRITER", "STOP_CAB_WRITER", "START_EXTERNAL_WRITER", "STOP_EXTERNAL_WRITER", "START_INTERIOR_WRITER", "STOP_INTERIOR_WRITER", "COMBINED_THROTTLE"]
-        if control_id in virtual_controls:
-            if control_id == "TOGGLE_COMBINED_THROTTLE":
-                if binding_type == "button" and value == 1.0: self.combined_throttle_cb.setChecked(True); return
-                if binding_type == "off_button" and value == 0.0: self.combined_throttle_cb.setChecked(False); return
-                if binding_type == "button" and value == 0.0 and 'off_button' not in control_bindings: self.combined_throttle_cb.setChecked(not self.combined_throttle_cb.isChecked()); return
-                if binding_type in ["button", "off_button"]: return
-            if control_id == "TOGGLE_INVERT_COMBINED":
-                if binding_type == "button" and value == 1.0: self.invert_combined_cb.setChecked(True); return
-                if binding_type == "off_button" and value == 0.0: self.invert_combined_cb.setChecked(False); return
-                if binding_type == "button" and value == 0.0 and 'off_button' not in control_bindings: self.invert_combined_cb.setChecked(not self.invert_combined_cb.isChecked()); return
-                if binding_type in ["button", "off_button"]: return
-            if control_id == "TOGGLE_TRACKIR":
-                # For toggle buttons: only respond to press (value=1.0), ignore release unless separate off_button exists
-                if binding_type == "button" and value == 1.0:
-                    # Toggle: if running, stop it; if stopped, start it
-                    if self.trackir_writer_process:
-                        self.stop_trackir_writer()
-                    else:
-                        self.start_trackir_writer()
-                    return
-                if binding_type == "off_button" and value == 0.0: 
-                    self.stop_trackir_writer()
-                    return
-                # Ignore button release (value=0.0) if no separate off_button
-                if binding_type == "button" and value == 0.0:
-                    return
-            if value == 1.0:
-                if control_id == "SCAN_CAB_CAMERA": self.start_camera_scan('cab'); return
-                if control_id == "SCAN_EXTERNAL_CAMERA": self.start_camera_scan('external'); return
-                if control_id == "SCAN_INTERIOR_CAMERA": self.start_camera_scan('interior'); return
-                if control_id == "RESCAN_CAB_CAMERA": self.restart_camera_scan('cab'); return
-                if control_id == "RESCAN_EXTERNAL_CAMERA": self.restart_camera_scan('external'); return
-                if control_id == "RESCAN_INTERIOR_CAMERA": self.restart_camera_scan('interior'); return
-                if control_id == "START_CAB_WRITER": self.start_individual_camera_writer('cab'); return
-                if control_id == "STOP_CAB_WRITER": self.stop_individual_camera_writer('cab'); return
-                if control_id == "START_EXTERNAL_WRITER": self.start_individual_camera_writer('external'); return
-                if control_id == "STOP_EXTERNAL_WRITER": self.stop_individual_camera_writer('external'); return
-                if control_id == "START_INTERIOR_WRITER": self.start_individual_camera_writer('interior'); return
-                if control_id == "STOP_INTERIOR_WRITER": self.stop_individual_camera_writer('interior'); return
-        widget = self.gui_controls.get(control_id)
-        if not widget or not widget.isEnabled(): return
-        definition = CONTROL_DEFINITIONS[control_id]
-        if definition['type'] == 'slider':
-            binding_data = self.bindings.get(control_id, {}).get(binding_type)
-            if not binding_data: return
-            if binding_type == 'axis':
-                if isinstance(binding_data, list): binding_data = binding_data[0]
-                if binding_data.get("inverted", False): value = -value
-                if 'id' in definition:
-                    min_val, max_val = widget.minimum(), widget.maximum(); target_value = int(min_val + ((value + 1) / 2) * (max_val - min_val)); current_value = widget.value()
-                    if target_value > current_value: [self.web_interface.send_ws_click(definition['id'][1]) for _ in range(target_value - current_value)]
-                    elif target_value < current_value: [self.web_interface.send_ws_click(definition['id'][0]) for _ in range(current_value - target_value)]
-                    widget.blockSignals(True); widget.setValue(target_value); widget.blockSignals(False)
-                else: 
-                    AXIS_DEADZONE = 0.02; AXIS_MAX_THRESHOLD = 0.95
-                    if abs(value) < AXIS_DEADZONE: value = 0.0
-                    elif abs(value) > AXIS_MAX_THRESHOLD: value = 1.0 if value > 0 else -1.0
-                    range_fraction = (value + 1) / 2.0; self.web_interface.send_control_value(control_id, range_fraction)
-                    display_value = int(widget.minimum() + range_fraction * (widget.maximum() - widget.minimum()))
-                    widget.blockSignals(True); widget.setValue(display_value); widget.blockSignals(False)
-            elif binding_type in ["increase", "decrease"] and value == 1.0:
-                if self.bindings.get(control_id, {}).get("incremental_mode", False):
-                    new_val = max(widget.minimum(), min(widget.maximum(), widget.value() + (1 if binding_type == 'increase' else -1)))
-                    self.send_slider_value_from_gui(control_id, new_val); widget.setValue(new_val)
-        elif definition['type'] == 'button':
-            command_id = definition.get('id')
-            if command_id is None: return
-            
-            # OVERRIDE: Toggle on Press
-            if override == 'toggle_on_press':
-                if value == 1.0: # Press event only
-                     self.web_interface.send_ws_click(command_id)
-                     # Visually toggle the GUI button
-                     widget.blockSignals(True)
-                     widget.setChecked(not widget.isChecked())
-                     widget.blockSignals(False)
-                return # Skip standard processing
-            
-            if definition.get("send_as") == "value": self.web_interface.send_control_value(control_id, value); widget.blockSignals(True); widget.setChecked(value == 1.0); widget.blockSignals(False); return
-            behavior = definition.get("behavior")
-            if behavior == "toggle":
-                # TOGGLE BEHAVIOR (from old working code):
-                # - Momentary button (joystick): bound to 'button' only, fires on press (value=1.0)
-                # - Maintained switch (Saitek): bound to 'button' (ON) AND 'off_button' (OFF)
-                # 
-                # Send click when:
-                # 1. 'button' binding fires with value=1.0 (press OR switch ON)
-                # 2. 'off_button' binding fires (ANY value - usually 0.0 for Saitek OFF)
-                if (binding_type == 'button' and value == 1.0) or (binding_type == 'off_button'):
-                    self.web_interface.send_ws_click(command_id)
-                    self.log_message(f"✓ Toggle click sent for {control_id} (type={binding_type}, value={value})", "BIND")
                 
-                # Update GUI state to reflect physical input's state
-                widget.blockSignals(True)
-                widget.setChecked(value == 1.0)
-                widget.blockSignals(False)
-            elif behavior == "hold": 
-                event = "buttonDown" if value == 1.0 else "buttonUp"
-                self.web_interface.send_button_event(command_id, event)
-                self.log_message(f"✓ Hold event sent for {control_id}: {event} (value={value})", "BIND")
-                widget.blockSignals(True); widget.setChecked(value == 1.0); widget.blockSignals(False)
-            elif value == 1.0: self.web_interface.send_ws_click(command_id)
-    
-    def execute_step_binding(self, control_id, target_step_str):
-        """Execute a stepped slider binding (for 3-way switches, etc.)"""
-        widget = self.gui_controls.get(control_id)
-        if not widget or not widget.isEnabled(): return
-        definition = CONTROL_DEFINITIONS[control_id]
-        if 'id' not in definition or definition.get('type') != 'slider': return
-        try: target_value = int(target_step_str)
-        except (ValueError, TypeError): self.log_message(f"Invalid step value '{target_step_str}' for {control_id}", "ERROR"); return
-        # Track which buttons are pressed for this control (for 3-way switch neutral detection)
-        if not hasattr(self, '_active_step_buttons'): self._active_step_buttons = {}
-        
-        # IMPORTANT: For 3-way switches, only ONE position can be active at a time
-        # Clear ALL other steps for this control before setting the new one
-        control_steps = self._active_step_buttons.setdefault(control_id, {})
-        control_steps.clear()  # Clear all previous steps
-        control_steps[target_step_str] = True  # Set only this step as active
-        
-        self.log_message(f"{control_id}: Button pressed for step {target_step_str}, cleared other steps", "DEBUG")
-        current_value = self.slider_last_values.get(control_id, widget.value())
-        if target_value > current_value: [self.web_interface.send_ws_click(definition['id'][1]) for _ in range(target_value - current_value)]
-        elif target_value < current_value: [self.web_interface.send_ws_click(definition['id'][0]) for _ in range(current_value - target_value)]
-        widget.blockSignals(True); widget.setValue(target_value); widget.blockSignals(False); self.slider_last_values[control_id] = target_value; self.log_message(f"Set {control_id} to step {target_value}", "BINDING")
-
-    def release_step_binding(self, control_id, step_str):
-        """Handle button release for stepped sliders - check if we should return to neutral"""
-        if not hasattr(self, '_active_step_buttons'): return
-        control_steps = self._active_step_buttons.get(control_id, {})
-        # Mark this step button as released
-        if step_str in control_steps:
-            del control_steps[step_str]
-            self.log_message(f"{control_id}: Released step {step_str}, remaining active: {list(control_steps.keys())}", "DEBUG")
-        
-        # If ALL buttons for this control are released, go to neutral (step 0)
-        if not control_steps:
-            self.log_message(f"{control_id}: All buttons released, returning to NEUTRAL (step 0)", "BINDING")
-            definition = CONTROL_DEFINITIONS[control_id]; steps = definition.get('steps', {})
-            neutral_step = None
-            for step_val, step_name in steps.items():
-                if step_val == "0" or "Neutral" in step_name or "N" == step_name: neutral_step = step_val; break
-            if neutral_step is not None: self.execute_step_binding(control_id, neutral_step)
-
-    def handle_combined_brake_logic(self, brake_type, value):
-        throttle_widget = self.gui_controls.get("THROTTLE"); brake_widget = self.gui_controls.get(brake_type); combined_widget = self.gui_controls.get("COMBINED_THROTTLE")
-        if not all([throttle_widget, brake_widget, combined_widget]): return
-        if value >= 0: self.web_interface.send_control_value("THROTTLE", value); self.web_interface.send_control_value(brake_type, 0.0); throttle_display = int(value * 100); brake_display = 0; combined_display = int(value * 100)
-        else: brake_fraction = -value; self.web_interface.send_control_value("THROTTLE", 0.0); self.web_interface.send_control_value(brake_type, brake_fraction); throttle_display = 0; brake_display = int(brake_fraction * 100); combined_display = -int(brake_fraction * 100)
-        throttle_widget.blockSignals(True); throttle_widget.setValue(throttle_display); throttle_widget.blockSignals(False); brake_widget.blockSignals(True); brake_widget.setValue(brake_display); brake_widget.blockSignals(False); combined_widget.blockSignals(True); combined_widget.setValue(combined_display); combined_widget.blockSignals(False)
+        except Exception as e:
+            self.log_message(f"⚠ Workaround system error: {e}", "ERROR")
+            import traceback
+            self.log_message(f"Stack trace: {traceback.format_exc()}", "ERROR")
+            return
 
     def toggle_device_listener(self, item):
         device_id = item.data(Qt.UserRole); is_checked = item.checkState() == Qt.Checked
         if device_id == "SAITEK_PANEL":
             if is_checked:
                 if self.saitek_manager.start_listening(): self.log_message("Saitek Panel listener started.", "APP")
-                else: self.log_message("ERROR: Failed to start Saitek Panel listener.", "ERROR"); item.setCheckState(Qt.Unchecked)
+                else: self.log_message("⚠ Saitek Panel could not be opened now - it will be opened as soon as it is available.", "APP")
             else: self.saitek_manager.stop_listening()
         else: self.joystick_manager.start_listening(device_id) if is_checked else self.joystick_manager.stop_listening(device_id)
         
@@ -1539,50 +1314,38 @@ class MainAppWindow(QMainWindow):
             if type == "button" and value == 1.0: editor.capture_input(joy_id, type, index, value, "joystick")
             elif type == "axis" and abs(value) > 0.8: editor.capture_input(joy_id, type, index, value, "joystick")
         self.joystick_manager.raw_joystick_event.connect(joy_capture)
-        def saitek_capture(switch, state): editor.capture_input(None, "saitek", switch, 1.0 if state == "ON" else 0.0, "saitek")
-        self.saitek_manager.saitek_event.connect(saitek_capture)
+        def saitek_capture(timestamp, changes):
+            for switch, state in changes: editor.capture_input(None, "saitek", switch, 1.0 if state == "ON" else 0.0, "saitek")
+        self.saitek_manager.saitek_changes.connect(saitek_capture)
         if editor.exec_():
             self.bindings = editor.get_bindings()
             if self.current_profile_path: self.save_profile()
+        # The editor works on a shallow copy, so even a cancelled session may have touched nested bindings
+        self.rebuild_binding_index()
         try:
             self.joystick_manager.raw_joystick_event.disconnect(joy_capture)
-            self.saitek_manager.saitek_event.disconnect(saitek_capture)
+            self.saitek_manager.saitek_changes.disconnect(saitek_capture)
         except TypeError: pass
 
     def handle_slider_move(self, control_id, slider, value):
-        if control_id in self.bindings and "axis" in self.bindings.get(control_id, {}): return
+        if self.input_router.model.get(control_id, EMPTY_CONTROL).axis: return
         self.send_slider_value_from_gui(control_id, value)
         
     def handle_slider_release(self, control_id, slider):
-        if control_id in self.bindings and "axis" in self.bindings.get(control_id, {}): return
+        if self.input_router.model.get(control_id, EMPTY_CONTROL).axis: return
         self.send_slider_value_from_gui(control_id, slider.value())
         
     def send_slider_value_from_gui(self, control_id, value):
-        slider = self.gui_controls[control_id]; definition = CONTROL_DEFINITIONS[control_id]
-        if 'id' in definition:
-            last_val = self.slider_last_values.get(control_id, slider.value())
-            if value > last_val: [self.web_interface.send_ws_click(definition['id'][1]) for _ in range(value - last_val)]
-            elif value < last_val: [self.web_interface.send_ws_click(definition['id'][0]) for _ in range(last_val - value)]
-            self.slider_last_values[control_id] = value
-        else:
-            min_val, max_val = slider.minimum(), slider.maximum(); range_size = max_val - min_val
-            fraction = (value - min_val) / range_size if range_size > 0 else 0
-            self.web_interface.send_control_value(control_id, fraction)
+        self.route(self.input_router.set_slider_value, control_id, value)
             
     def handle_button_press(self, control_id):
-        command_id = CONTROL_DEFINITIONS[control_id].get('id')
-        if command_id is not None: self.web_interface.send_ws_click(command_id)
+        self.route(self.input_router.click, control_id)
 
     def handle_gui_toggle(self, control_id, is_checked):
-        definition = CONTROL_DEFINITIONS[control_id]; command_id = definition.get('id')
-        if command_id is None: return
-        if definition.get("send_as") == "value": self.web_interface.send_control_value(control_id, 1.0 if is_checked else 0.0); return
-        behavior = definition.get("behavior")
-        if behavior == "toggle": self.web_interface.send_ws_click(command_id)
-        elif behavior == "hold": event = "buttonDown" if is_checked else "buttonUp"; self.web_interface.send_button_event(command_id, event)
+        self.route(self.input_router.set_checked, control_id, is_checked)
 
     def new_profile(self):
-        self.bindings.clear(); self.current_profile_path = None; self.slider_last_values.clear(); self.combined_throttle_cb.setChecked(False); self.invert_combined_cb.setChecked(False); self.active_profile_label.setText("Profile: None")
+        self.bindings.clear(); self.rebuild_binding_index(); self.current_profile_path = None; self.route(self.input_router.reset_steps); self.combined_throttle_cb.setChecked(False); self.invert_combined_cb.setChecked(False); self.active_profile_label.setText("Profile: None")
         for i in range(self.device_list.count()): self.device_list.item(i).setCheckState(Qt.Unchecked)
         self.set_default_profile_action.setEnabled(False)
 
@@ -1626,7 +1389,7 @@ class MainAppWindow(QMainWindow):
             self.log_message(f"   File exists: {os.path.exists(path)}", "DEBUG")
             tree = etree.parse(path)
             self.log_message(f"✓ XML parsed successfully", "DEBUG")
-            self.bindings.clear(); self.slider_last_values.clear()
+            self.bindings.clear(); self.route(self.input_router.reset_steps)
             use_combined_el = tree.find("./Settings/UseCombinedThrottle"); self.combined_throttle_cb.setChecked(use_combined_el is not None and use_combined_el.text.lower() == 'true')
             invert_combined_el = tree.find("./Settings/InvertCombinedAxis"); self.invert_combined_cb.setChecked(invert_combined_el is not None and invert_combined_el.text.lower() == 'true')
             for bind_el in tree.xpath("/OpenRailsControlProfile/Bindings/Binding"):
@@ -1639,14 +1402,15 @@ class MainAppWindow(QMainWindow):
                     if binding_type == "values":
                         if "values" not in self.bindings[control]: self.bindings[control]["values"] = defaultdict(list)
                         for val_el in sub_el:
-                            data = {k: int(v) if k in ['joy_id', 'index'] else v for k, v in val_el.attrib.items() if k != 'step'}
+                            data = parse_binding_attrib({k: v for k, v in val_el.attrib.items() if k != 'step'})
                             self.bindings[control]["values"][val_el.get("step")].append(data)
                     else:
-                        data = {k: (v.lower() == 'true') if k == 'inverted' else (int(v) if k in ['joy_id', 'index'] else v) for k, v in sub_el.attrib.items()}
+                        data = parse_binding_attrib(sub_el.attrib)
                         if binding_type == 'axis': self.bindings[control][binding_type] = data
                         else:
                             if binding_type not in self.bindings[control]: self.bindings[control][binding_type] = []
                             self.bindings[control][binding_type].append(data)
+            self.rebuild_binding_index()
             for i in range(self.device_list.count()): self.device_list.item(i).setCheckState(Qt.Unchecked)
             active_ids = {el.get("id") for el in tree.xpath("/OpenRailsControlProfile/ActiveJoysticks/Joystick")}
             for i in range(self.device_list.count()):
@@ -1709,15 +1473,17 @@ class MainAppWindow(QMainWindow):
         layout.addWidget(text_edit); dialog.exec_()
 
     def refresh_devices(self):
-        new_joysticks = self.joystick_manager.reinitialize(); self.populate_device_list(new_joysticks)
+        # reinitialize() emits devices_changed, which repopulates the list; with an input thread it owns SDL, so it rescans there
+        self.route(self.joystick_manager.reinitialize)
         
     def populate_device_list(self, devices=None):
         if devices is None: devices = self.joystick_manager.get_devices()
         states = {self.device_list.item(i).data(Qt.UserRole): self.device_list.item(i).checkState() for i in range(self.device_list.count())}; self.device_list.clear()
         for joy_id, name in devices.items():
             item = QListWidgetItem(f"Joy {joy_id}: {name}"); item.setFlags(item.flags() | Qt.ItemIsUserCheckable); item.setCheckState(states.get(joy_id, Qt.Unchecked)); item.setData(Qt.UserRole, joy_id); self.device_list.addItem(item)
-        if self.saitek_manager.is_connected():
-            item = QListWidgetItem("Saitek Switch Panel"); item.setFlags(item.flags() | Qt.ItemIsUserCheckable); item.setCheckState(states.get("SAITEK_PANEL", Qt.Unchecked)); item.setData(Qt.UserRole, "SAITEK_PANEL"); self.device_list.addItem(item)
+        panels = self.saitek_manager.connected_panels()
+        if panels:
+            item = QListWidgetItem(", ".join(panel.name for panel in panels)); item.setFlags(item.flags() | Qt.ItemIsUserCheckable); item.setCheckState(Qt.Checked if self.saitek_manager.running else Qt.Unchecked); item.setData(Qt.UserRole, "SAITEK_PANEL"); self.device_list.addItem(item)
     
     def rebuild_launcher_buttons(self):
         while self.launch_button_layout.count():
@@ -2220,6 +1986,7 @@ class MainAppWindow(QMainWindow):
         self.save_app_config()
         
         # Shutdown managers
+        if self.input_thread: self.input_drain_timer.stop(); self.input_thread.stop()
         self.joystick_manager.shutdown()
         self.saitek_manager.shutdown()
         self.web_interface.stop()
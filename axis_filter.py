@@ -0,0 +1,77 @@
+# axis_filter.py
+# Per-binding shaping for analog axes: deadzone, saturation, a response curve
+# and hysteresis. The static part (deadzone, saturation, curve) is compiled
+# into a lookup table when the binding model is built, so shaping an event is
+# one indexed read. Hysteresis is the only stateful part and is a single
+# compare against the last accepted input.
+from array import array
+from functools import lru_cache
+
+CURVES = ('linear', 'expo', 'scurve', 'custom')
+DEFAULT_SATURATION = 0.95  # Inputs beyond this are treated as full deflection
+DEFAULT_HYSTERESIS = 0.0
+DEFAULT_CURVE_AMOUNT = 0.5
+LUT_SIZE = 8193  # Odd, so the centre of the axis lands exactly on an entry
+LUT_HALF = (LUT_SIZE - 1) / 2.0
+
+
+def parse_curve_points(text):
+    """Parse "x:y; x:y; ..." (0..1 each) into sorted points anchored at (0, 0) and (1, 1)"""
+    points = {0.0: 0.0, 1.0: 1.0}
+    for pair in (text or "").replace(",", ";").split(";"):
+        if ":" not in pair: continue
+        try: x, y = (float(part) for part in pair.split(":", 1))
+        except ValueError: continue
+        if 0.0 <= x <= 1.0: points[x] = min(max(y, 0.0), 1.0)
+    return tuple(sorted(points.items()))
+
+
+def _curve(t, curve, amount, points):
+    """Map a normalised deflection t (0..1) through the response curve"""
+    if curve == 'expo': return (1.0 - amount) * t + amount * t ** 3
+    if curve == 'scurve': return (1.0 - amount) * t + amount * t * t * (3.0 - 2.0 * t)
+    if curve == 'custom':
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if t <= x1: return y0 if x1 == x0 else y0 + (y1 - y0) * (t - x0) / (x1 - x0)
+        return points[-1][1]
+    return t
+
+
+@lru_cache(maxsize=None)
+def build_lut(deadzone, saturation, curve, amount, points):
+    """Table of shaped outputs for raw inputs -1..1.
+
+    Inside the deadzone the output is 0 and beyond saturation it is full
+    deflection. In between, the curve reshapes the live band while its ends
+    stay where they are, so a linear curve reproduces the plain
+    deadzone/saturation behaviour exactly.
+    """
+    saturation = max(saturation, deadzone + 1e-6); band = saturation - deadzone
+    lut = array('d', bytes(8 * LUT_SIZE))
+    for i in range(LUT_SIZE):
+        raw = i / LUT_HALF - 1.0; magnitude = abs(raw)
+        if magnitude < deadzone: out = 0.0
+        elif magnitude > saturation: out = 1.0
+        else: out = deadzone + band * _curve((magnitude - deadzone) / band, curve, amount, points)
+        lut[i] = out if raw >= 0 else -out
+    return lut
+
+
+class AxisFilter:
+    """Compiled filter for one axis binding. apply() returns None when the input moved less than the hysteresis"""
+    __slots__ = ('lut', 'hysteresis', 'last_input', 'last_output')
+
+    def __init__(self, deadzone, saturation=DEFAULT_SATURATION, curve='linear', curve_amount=DEFAULT_CURVE_AMOUNT, curve_points='', hysteresis=DEFAULT_HYSTERESIS):
+        curve = curve if curve in CURVES else 'linear'
+        self.lut = build_lut(round(deadzone, 4), round(saturation, 4), curve, round(min(max(curve_amount, 0.0), 1.0), 4), parse_curve_points(curve_points) if curve == 'custom' else ())
+        self.hysteresis = hysteresis; self.last_input = None; self.last_output = None
+
+    def apply(self, value):
+        index = int((value + 1.0) * LUT_HALF + 0.5)
+        output = self.lut[0 if index < 0 else LUT_SIZE - 1 if index >= LUT_SIZE else index]
+        if self.last_input is not None:
+            if output == self.last_output: return None
+            # Jitter smaller than the hysteresis is ignored, but the rest positions (centre, full) are always reached
+            if abs(value - self.last_input) < self.hysteresis and output not in (0.0, 1.0, -1.0): return None
+        self.last_input = value; self.last_output = output
+        return output
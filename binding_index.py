@@ -0,0 +1,50 @@
+# binding_index.py
+# Compiled lookup tables for input dispatch. Bindings are stored per control
+# (control -> binding type -> bindings), which is the right shape for the
+# editor and the XML profile but the wrong one for the input path, where every
+# event would have to scan all of them. These tables are built from the
+# binding model once when a profile is loaded or the bindings editor closes.
+from collections import defaultdict
+
+
+def build_joystick_index(model):
+    """Compile joystick bindings into {(joy_id, input_type, index): [action, ...]}.
+
+    Each action is a (control_id, binding_type, override, step) tuple. 'axis'
+    bindings are keyed under input_type 'axis', every other binding type under
+    'button'. Step bindings use binding_type 'values' and carry their step;
+    for all other actions step is None. Within one control the step actions
+    come first, matching the order the dispatcher has always checked them in.
+    """
+    index = defaultdict(list)
+    for control_id, control in model.items():
+        for step, step_bindings in control.values.items():
+            for binding in step_bindings:
+                if binding.device_type == 'joystick':
+                    index[(binding.joy_id, 'button', binding.index)].append((control_id, 'values', binding.override, step))
+        for binding_type, slot in control.slots.items():
+            input_type = 'axis' if binding_type == 'axis' else 'button'
+            for binding in slot:
+                if binding.device_type == 'joystick':
+                    index[(binding.joy_id, input_type, binding.index)].append((control_id, binding_type, binding.override, None))
+    return dict(index)
+
+
+def build_saitek_index(model):
+    """Compile Saitek panel bindings into {(switch, state): [action, ...]}.
+
+    Actions have the same (control_id, binding_type, override, step) shape as
+    the joystick index. Step bindings fire when their switch turns ON whatever
+    state they were captured with, so they are only filed under (switch, "ON").
+    """
+    index = defaultdict(list)
+    for control_id, control in model.items():
+        for step, step_bindings in control.values.items():
+            for binding in step_bindings:
+                if binding.device_type == 'saitek':
+                    index[(binding.switch, "ON")].append((control_id, 'values', binding.override, step))
+        for binding_type, slot in control.slots.items():
+            for binding in slot:
+                if binding.device_type == 'saitek':
+                    index[(binding.switch, binding.state)].append((control_id, binding_type, binding.override, None))
+    return dict(index)
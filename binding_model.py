@@ -0,0 +1,123 @@
+# binding_model.py
+# Normalized, typed view of a profile's bindings for the input path.
+# self.bindings keeps the loose editor/XML shape (a slot may hold a dict or a
+# list, values may be strings or ints depending on where they came from).
+# The dispatcher only ever sees the records built here: every slot is a list,
+# every field already has its final type and overrides are pre-parsed.
+from definitions import CONTROL_DEFINITIONS
+from axis_filter import AxisFilter, DEFAULT_SATURATION, DEFAULT_HYSTERESIS, DEFAULT_CURVE_AMOUNT
+
+# Keys inside a control's bindings dict that are settings, not bindings
+SETTING_KEYS = ('use_workaround', 'incremental_mode', 'binding_behavior_override')
+
+DEFAULT_DEADZONE = 0.02
+
+# XML attribute -> parser, shared by the profile loader and the model builder
+INT_FIELDS = ('joy_id', 'index')
+FLOAT_FIELDS = ('deadzone', 'sensitivity', 'saturation', 'hysteresis', 'curve_amount')
+BOOL_FIELDS = ('inverted', '_button_mode')
+
+
+def _to_bool(value):
+    return value if isinstance(value, bool) else str(value).lower() == 'true'
+
+
+def _to_number(parse, value, default):
+    if value is None: return default
+    try: return parse(value)
+    except (TypeError, ValueError): return default
+
+
+def parse_binding_attrib(attrib):
+    """Convert the string attributes of a profile binding element to typed values"""
+    data = {}
+    for key, value in attrib.items():
+        try:
+            if key in INT_FIELDS: value = int(value)
+            elif key in FLOAT_FIELDS: value = float(value)
+            elif key in BOOL_FIELDS: value = _to_bool(value)
+        except (TypeError, ValueError): pass
+        data[key] = value
+    return data
+
+
+class Binding:
+    """One physical input bound to a control slot"""
+    __slots__ = ('device_type', 'joy_id', 'input_type', 'index', 'switch', 'state', 'key',
+                 'override', 'inverted', 'deadzone', 'sensitivity', 'button_mode', 'filter')
+
+    def __init__(self, data, slot=None):
+        self.device_type = data.get('device_type')
+        self.joy_id = _to_number(int, data.get('joy_id'), None)
+        self.input_type = data.get('type')
+        self.index = _to_number(int, data.get('index'), None)
+        self.switch = data.get('switch'); self.state = data.get('state'); self.key = data.get('key')
+        override = data.get('override')
+        self.override = None if override in (None, '', 'default') else override
+        self.inverted = _to_bool(data.get('inverted', False))
+        self.deadzone = _to_number(float, data.get('deadzone'), DEFAULT_DEADZONE)
+        self.sensitivity = _to_number(float, data.get('sensitivity'), 1.0)
+        self.button_mode = _to_bool(data.get('_button_mode', False))
+        # Axis shaping is compiled once here for every binding in the axis slot (older profiles may not say type="axis");
+        # the dispatcher only calls filter.apply()
+        self.filter = AxisFilter(self.deadzone, _to_number(float, data.get('saturation'), DEFAULT_SATURATION), data.get('curve', 'linear'),
+                                 _to_number(float, data.get('curve_amount'), DEFAULT_CURVE_AMOUNT), data.get('curve_points', ''),
+                                 _to_number(float, data.get('hysteresis'), DEFAULT_HYSTERESIS)) if slot == 'axis' else None
+
+    def __repr__(self):
+        return f"Binding({self.device_type}, joy={self.joy_id}, index={self.index}, switch={self.switch}, state={self.state}, key={self.key})"
+
+
+class ControlBindings:
+    """All bindings of one control: typed slots plus the per-control settings"""
+    __slots__ = ('control_id', 'slots', 'values', 'use_workaround', 'incremental_mode', 'axis', 'keyboard')
+
+    def __init__(self, control_id, slots, values, use_workaround=False, incremental_mode=False):
+        self.control_id = control_id
+        self.slots = slots  # binding_type -> [Binding, ...]
+        self.values = values  # int step -> [Binding, ...]
+        self.use_workaround = use_workaround; self.incremental_mode = incremental_mode
+        self.axis = slots['axis'][0] if slots.get('axis') else None
+        # Keyboard bindings the workaround presses, in the order it has always collected them
+        self.keyboard = tuple(b for t in ('button', 'off_button', 'increase', 'decrease') for b in slots.get(t, ()) if b.device_type == 'keyboard' and b.key)
+
+    def has(self, binding_type):
+        return bool(self.slots.get(binding_type))
+
+
+EMPTY_CONTROL = ControlBindings(None, {}, {})
+
+
+def _bindings_of(binding_data, slot=None):
+    items = binding_data if isinstance(binding_data, list) else [binding_data]
+    return [Binding(b, slot) for b in items if isinstance(b, dict)]
+
+
+def build_binding_model(bindings):
+    """Build {control_id: ControlBindings} from the editor/profile bindings dict"""
+    model = {}
+    for control_id, control_bindings in bindings.items():
+        slots = {}; values = {}
+        for binding_type, binding_data in control_bindings.items():
+            if binding_type in SETTING_KEYS: continue
+            if binding_type == 'values':
+                for step, step_bindings in binding_data.items():
+                    try: step = int(step)
+                    except (TypeError, ValueError): continue
+                    parsed = _bindings_of(step_bindings)
+                    if parsed: values.setdefault(step, []).extend(parsed)
+            else:
+                parsed = _bindings_of(binding_data, binding_type)
+                if parsed: slots[binding_type] = parsed
+        model[control_id] = ControlBindings(control_id, slots, values, _to_bool(control_bindings.get('use_workaround', False)), _to_bool(control_bindings.get('incremental_mode', False)))
+    return model
+
+
+def _find_neutral_step(definition):
+    for step_val, step_name in definition.get('steps', {}).items():
+        if step_val == "0" or "Neutral" in step_name or "N" == step_name: return int(step_val)
+    return None
+
+
+# Step a stepped slider returns to once all of its step buttons are released
+NEUTRAL_STEPS = {control_id: _find_neutral_step(definition) for control_id, definition in CONTROL_DEFINITIONS.items() if 'steps' in definition}
@@ -1,15 +1,18 @@
 # controls.py - Fixed version with reliable joystick input
 import pygame
+import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal, Qt, QTimer
 from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QVBoxLayout, QListWidget, QLabel, QCheckBox, QGroupBox,
                              QFormLayout, QPushButton, QDialogButtonBox, QListWidgetItem, QStackedWidget,
                              QWidget, QScrollArea, QProgressBar, QGridLayout, QMenu, QTableWidget,
-                             QTableWidgetItem, QSlider, QRadioButton)
+                             QTableWidgetItem, QSlider, QRadioButton, QComboBox, QLineEdit)
 from PyQt5.QtGui import QColor
 import threading
+import time
 import re
 from functools import partial
 from definitions import CONTROL_DEFINITIONS
+from axis_filter import DEFAULT_SATURATION, DEFAULT_HYSTERESIS, DEFAULT_CURVE_AMOUNT
 import os
 import sys
 
@@ -22,49 +25,117 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# SDL joystick events consumed by the 'events' backend
+JOY_EVENT_TYPES = [pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION, pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED]
+# Each hat is exposed as four buttons numbered after the device's real buttons: up, right, down, left
+HAT_DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+DEFAULT_AXIS_THRESHOLD = 0.005
+
+class DeviceState:
+    """Preallocated snapshot arrays for one joystick: the last reported state and a read buffer.
+    Each poll fills the read buffers and diffs them against the last state in one compare per input kind."""
+    __slots__ = ('axes', 'buttons', 'hats', 'axes_read', 'buttons_read', 'hats_read', 'axes_diff',
+                 'axes_changed', 'buttons_changed', 'hats_changed', 'hat_base')
+    
+    def __init__(self, joy):
+        self.axes = np.zeros(joy.get_numaxes(), dtype=np.float64)
+        self.buttons = np.zeros(joy.get_numbuttons(), dtype=np.int8)
+        self.hats = np.zeros((joy.get_numhats(), 2), dtype=np.int8)
+        self.axes_read = np.zeros_like(self.axes); self.axes_diff = np.zeros_like(self.axes)
+        self.buttons_read = np.zeros_like(self.buttons); self.hats_read = np.zeros_like(self.hats)
+        # Compare results, so an idle poll allocates nothing
+        self.axes_changed = np.zeros(len(self.axes), dtype=bool); self.buttons_changed = np.zeros(len(self.buttons), dtype=bool)
+        self.hats_changed = np.zeros(self.hats.shape, dtype=bool)
+        self.hat_base = len(self.buttons)  # First button index used for hat directions
+
 class JoystickManager(QObject):
     raw_joystick_event = pyqtSignal(int, str, int, object)
+    raw_joystick_batch = pyqtSignal(list)  # All changes of one poll, as (joy_id, type, index, value, timestamp)
+    devices_changed = pyqtSignal()
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        pygame.init()
-        pygame.joystick.init()
-        self.joysticks = {i: pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())}
+        self.instance_ids = {}  # SDL instance id -> joy_id
+        self.device_states = {}  # joy_id -> DeviceState
+        self._init_sdl()
         
-        # Initialize all joysticks
-        for joy in self.joysticks.values():
-            joy.init()
-        
-        # Track last axis values for change detection
-        self.last_axis_values = {}
-        self.last_button_values = {}
+        # Single change-detection stage: axis moves at or below this are not reported
+        self.axis_threshold = DEFAULT_AXIS_THRESHOLD
         
         # Polling timer instead of event thread
         self.poll_timer = QTimer()
         self.poll_timer.timeout.connect(self._poll_joysticks)
         self.active_joysticks = set()
+        
+        # In threaded mode the input thread calls poll() itself and the timer stays off
+        self.threaded = False
+        self.lock = threading.Lock()
+        self.backend = "poll"
+    
+    def _init_sdl(self):
+        pygame.init()
+        pygame.joystick.init()
+        # SDL event timestamps are milliseconds since init; this maps them onto time.monotonic()
+        self.sdl_epoch = time.monotonic() - pygame.time.get_ticks() / 1000.0
+        self._open_all()
+    
+    def adopt_thread(self):
+        """Restart SDL on the calling thread. SDL only supports pumping events on the thread that initialised
+        its video subsystem, so in threaded mode the input thread calls this before its first poll; from then
+        on poll(), reinitialize() and shutdown() belong to that thread"""
+        with self.lock:
+            pygame.quit()
+            self._init_sdl()
+            self.set_backend(self.backend)
+        self.devices_changed.emit()
+    
+    def release_thread(self):
+        """Shut SDL down on the thread that adopted it, as that thread's last act"""
+        with self.lock:
+            pygame.quit()
+    
+    def _open_all(self):
+        self.joysticks = {}; self.instance_ids.clear(); self.device_states = {}
+        for i in range(pygame.joystick.get_count()):
+            self._open(i)
+    
+    def _open(self, device_index, joy_id=None):
+        """Open SDL device device_index as joy_id (by default the same number)"""
+        if joy_id is None:
+            joy_id = device_index
+        joy = pygame.joystick.Joystick(device_index)
+        joy.init()
+        self.joysticks[joy_id] = joy
+        self.instance_ids[joy.get_instance_id()] = joy_id
+        self.device_states[joy_id] = DeviceState(joy)
+    
+    def set_backend(self, backend):
+        """'poll' reads every axis and button each tick; 'events' consumes SDL's joystick event queue"""
+        self.backend = backend if backend in ("poll", "events") else "poll"
+        if self.backend == "events":
+            # Only joystick events are queued, so nothing else piles up between reads
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(JOY_EVENT_TYPES)
+            pygame.event.clear()
     
     def get_devices(self):
-        return {i: j.get_name() for i, j in self.joysticks.items()}
+        with self.lock:  # Hotplug may add devices on the input thread
+            return {i: j.get_name() for i, j in self.joysticks.items()}
     
     def reinitialize(self):
+        """Re-scan the devices. In threaded mode this must run on the input thread, which owns SDL"""
         # Stop polling
-        self.poll_timer.stop()
+        if not self.threaded:
+            self.poll_timer.stop()
         self.active_joysticks.clear()
         
-        # Reinit pygame
-        pygame.joystick.quit()
-        pygame.joystick.init()
-        self.joysticks = {i: pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())}
-        
-        # Initialize all joysticks
-        for joy in self.joysticks.values():
-            joy.init()
-        
-        # Clear tracking
-        self.last_axis_values.clear()
-        self.last_button_values.clear()
+        with self.lock:
+            # Reinit pygame
+            pygame.joystick.quit()
+            pygame.joystick.init()
+            self._open_all()  # Fresh device states, so change tracking starts over
         
+        self.devices_changed.emit()
         return self.get_devices()
     
     def start_listening(self, joystick_id):
@@ -73,7 +144,7 @@ class JoystickManager(QObject):
             self.active_joysticks.add(joystick_id)
             
             # Start timer if not running (100Hz polling = 10ms)
-            if not self.poll_timer.isActive():
+            if not self.threaded and not self.poll_timer.isActive():
                 self.poll_timer.start(10)
     
     def stop_listening(self, joystick_id):
@@ -85,46 +156,123 @@ class JoystickManager(QObject):
             self.poll_timer.stop()
     
     def _poll_joysticks(self):
-        """Poll all active joysticks for state changes"""
+        """Timer slot: poll and emit the changes, as one batch and one by one"""
+        events = self.poll()
+        if events:
+            self.raw_joystick_batch.emit(events)
+        for event in events:
+            self.raw_joystick_event.emit(*event[:4])
+    
+    def poll(self):
+        """Read all active joysticks, returning [(joy_id, type, index, value, timestamp), ...]"""
+        with self.lock:
+            return self._read_events() if self.backend == "events" else self._poll_changes()
+    
+    def _hat_changes(self, joy_id, state, hat_idx, value, timestamp, events):
+        last_value = tuple(state.hats[hat_idx])
+        if value == last_value:
+            return
+        state.hats[hat_idx] = value
+        
+        base_idx = state.hat_base + hat_idx * 4
+        for direction_idx, (dx, dy) in enumerate(HAT_DIRECTIONS):
+            was_pressed = (dx != 0 and last_value[0] == dx) or (dy != 0 and last_value[1] == dy)
+            is_pressed = (dx != 0 and value[0] == dx) or (dy != 0 and value[1] == dy)
+            if was_pressed != is_pressed:
+                events.append((joy_id, "button", base_idx + direction_idx, 1.0 if is_pressed else 0.0, timestamp))
+    
+    def _poll_changes(self):
+        events = []
         # Process any pending events first
         pygame.event.pump()
+        timestamp = time.monotonic()
         
         for joy_id in list(self.active_joysticks):
-            if joy_id not in self.joysticks:
+            joy = self.joysticks.get(joy_id); state = self.device_states.get(joy_id)
+            if joy is None or state is None:
                 continue
             
-            joy = self.joysticks[joy_id]
+            # Read the whole device into the preallocated buffers
+            axes_read, buttons_read, hats_read = state.axes_read, state.buttons_read, state.hats_read
+            for axis_idx in range(len(axes_read)):
+                axes_read[axis_idx] = joy.get_axis(axis_idx)
+            for btn_idx in range(len(buttons_read)):
+                buttons_read[btn_idx] = joy.get_button(btn_idx)
+            for hat_idx in range(len(hats_read)):
+                hats_read[hat_idx] = joy.get_hat(hat_idx)
             
-            # Poll all axes
-            num_axes = joy.get_numaxes()
-            for axis_idx in range(num_axes):
-                value = joy.get_axis(axis_idx)
-                
-                # Check if value changed significantly (0.5% threshold)
-                last_key = f"{joy_id}_{axis_idx}"
-                last_value = self.last_axis_values.get(last_key, 0.0)
-                
-                if abs(value - last_value) > 0.005:
-                    self.last_axis_values[last_key] = value
-                    self.raw_joystick_event.emit(joy_id, "axis", axis_idx, value)
+            # One compare per input kind into preallocated buffers; changed indices are only looked up when something changed
+            np.subtract(axes_read, state.axes, out=state.axes_diff); np.abs(state.axes_diff, out=state.axes_diff)
+            if np.greater(state.axes_diff, self.axis_threshold, out=state.axes_changed).any():
+                for axis_idx in np.flatnonzero(state.axes_changed):
+                    value = float(axes_read[axis_idx]); state.axes[axis_idx] = value
+                    events.append((joy_id, "axis", int(axis_idx), value, timestamp))
+            if np.not_equal(buttons_read, state.buttons, out=state.buttons_changed).any():
+                for btn_idx in np.flatnonzero(state.buttons_changed):
+                    state.buttons[btn_idx] = buttons_read[btn_idx]
+                    events.append((joy_id, "button", int(btn_idx), float(buttons_read[btn_idx]), timestamp))
+            if np.not_equal(hats_read, state.hats, out=state.hats_changed).any():
+                for hat_idx in np.flatnonzero(state.hats_changed.any(axis=1)):
+                    self._hat_changes(joy_id, state, int(hat_idx), (int(hats_read[hat_idx, 0]), int(hats_read[hat_idx, 1])), timestamp, events)
+        
+        return events
+    
+    def _read_events(self):
+        """Convert queued SDL joystick events. Nothing is read when nothing moved, and a
+        press and release that both land between two reads are still delivered in order."""
+        events = []
+        for event in pygame.event.get(JOY_EVENT_TYPES):
+            if event.type == pygame.JOYDEVICEADDED:
+                self._device_added(event.device_index)
+                continue
+            if event.type == pygame.JOYDEVICEREMOVED:
+                self._device_removed(event.instance_id)
+                continue
             
-            # Poll all buttons
-            num_buttons = joy.get_numbuttons()
-            for btn_idx in range(num_buttons):
-                value = joy.get_button(btn_idx)
-                
-                # Check if button state changed
-                last_key = f"{joy_id}_{btn_idx}"
-                last_value = self.last_button_values.get(last_key, 0)
-                
-                if value != last_value:
-                    self.last_button_values[last_key] = value
-                    self.raw_joystick_event.emit(joy_id, "button", btn_idx, float(value))
+            joy_id = self.instance_ids.get(event.instance_id)
+            if joy_id not in self.active_joysticks:
+                continue
+            sdl_timestamp = getattr(event, "timestamp", None)
+            timestamp = self.sdl_epoch + sdl_timestamp / 1000.0 if sdl_timestamp else time.monotonic()
+            
+            state = self.device_states[joy_id]
+            if event.type == pygame.JOYAXISMOTION:
+                if abs(event.value - state.axes[event.axis]) > self.axis_threshold:
+                    state.axes[event.axis] = event.value
+                    events.append((joy_id, "axis", event.axis, event.value, timestamp))
+            elif event.type in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP):
+                value = 1 if event.type == pygame.JOYBUTTONDOWN else 0
+                state.buttons[event.button] = value
+                events.append((joy_id, "button", event.button, float(value), timestamp))
+            elif event.type == pygame.JOYHATMOTION:
+                self._hat_changes(joy_id, state, event.hat, tuple(event.value), timestamp, events)
+        return events
+    
+    def _device_added(self, device_index):
+        # SDL also reports the devices that were present at startup; those are already open. Device indices
+        # shift down after a removal, so a device is recognised by its instance id and gets the lowest unused joy_id
+        if pygame.joystick.Joystick(device_index).get_instance_id() in self.instance_ids:
+            return
+        joy_id = 0
+        while joy_id in self.joysticks:
+            joy_id += 1
+        self._open(device_index, joy_id)
+        self.devices_changed.emit()
+    
+    def _device_removed(self, instance_id):
+        joy_id = self.instance_ids.pop(instance_id, None)
+        if joy_id is None:
+            return
+        self.joysticks.pop(joy_id, None); self.device_states.pop(joy_id, None)
+        self.active_joysticks.discard(joy_id)
+        self.devices_changed.emit()
+    
     
     def shutdown(self):
         self.poll_timer.stop()
         self.active_joysticks.clear()
-        pygame.quit()
+        with self.lock:
+            pygame.quit()
 
 class OverrideConfigDialog(QDialog):
     def __init__(self, current_override, parent=None):
@@ -1077,7 +1225,7 @@ class AxisConfigDialog(QDialog):
     def __init__(self, existing_binding=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Configure Axis Binding")
-        self.resize(500, 400)
+        self.resize(500, 520)
         self.binding_data = existing_binding.copy() if existing_binding else {}
         self.is_listening = True
         
@@ -1139,6 +1287,52 @@ class AxisConfigDialog(QDialog):
         dead_layout.addWidget(self.deadzone_label)
         config_form.addRow("Deadzone:", dead_layout)
         
+        self.saturation_slider = QSlider(Qt.Horizontal)
+        self.saturation_slider.setRange(50, 100)  # Full deflection reached at 50% to 100% travel
+        self.saturation_slider.setValue(int(round(float(self.binding_data.get("saturation", DEFAULT_SATURATION)) * 100)))
+        self.saturation_label = QLabel(f"{self.saturation_slider.value()}%")
+        self.saturation_slider.valueChanged.connect(lambda v: self.saturation_label.setText(f"{v}%"))
+        
+        sat_layout = QHBoxLayout()
+        sat_layout.addWidget(self.saturation_slider)
+        sat_layout.addWidget(self.saturation_label)
+        config_form.addRow("Saturation:", sat_layout)
+        
+        self.hysteresis_slider = QSlider(Qt.Horizontal)
+        self.hysteresis_slider.setRange(0, 50)  # 0.0% to 5.0%, for worn or noisy potentiometers
+        self.hysteresis_slider.setValue(int(round(float(self.binding_data.get("hysteresis", DEFAULT_HYSTERESIS)) * 1000)))
+        self.hysteresis_label = QLabel(f"{self.hysteresis_slider.value() / 10:.1f}%")
+        self.hysteresis_slider.valueChanged.connect(lambda v: self.hysteresis_label.setText(f"{v / 10:.1f}%"))
+        
+        hyst_layout = QHBoxLayout()
+        hyst_layout.addWidget(self.hysteresis_slider)
+        hyst_layout.addWidget(self.hysteresis_label)
+        config_form.addRow("Hysteresis:", hyst_layout)
+        
+        self.curve_combo = QComboBox()
+        for curve_id, curve_name in (("linear", "Linear"), ("expo", "Expo"), ("scurve", "S-Curve"), ("custom", "Custom Points")):
+            self.curve_combo.addItem(curve_name, curve_id)
+        self.curve_combo.setCurrentIndex(max(0, self.curve_combo.findData(self.binding_data.get("curve", "linear"))))
+        config_form.addRow("Response Curve:", self.curve_combo)
+        
+        self.curve_amount_slider = QSlider(Qt.Horizontal)
+        self.curve_amount_slider.setRange(0, 100)
+        self.curve_amount_slider.setValue(int(round(float(self.binding_data.get("curve_amount", DEFAULT_CURVE_AMOUNT)) * 100)))
+        self.curve_amount_label = QLabel(f"{self.curve_amount_slider.value()}%")
+        self.curve_amount_slider.valueChanged.connect(lambda v: self.curve_amount_label.setText(f"{v}%"))
+        
+        amount_layout = QHBoxLayout()
+        amount_layout.addWidget(self.curve_amount_slider)
+        amount_layout.addWidget(self.curve_amount_label)
+        config_form.addRow("Curve Strength:", amount_layout)
+        
+        self.curve_points_edit = QLineEdit(self.binding_data.get("curve_points", ""))
+        self.curve_points_edit.setPlaceholderText("input:output pairs, e.g. 0.25:0.1; 0.5:0.3; 0.75:0.6")
+        config_form.addRow("Custom Points:", self.curve_points_edit)
+        
+        self.curve_combo.currentIndexChanged.connect(self.update_curve_widgets)
+        self.update_curve_widgets()
+        
         layout.addWidget(config_group)
         
         # Buttons
@@ -1152,6 +1346,11 @@ class AxisConfigDialog(QDialog):
             self.device_info_label.setText(f"Joy {existing_binding['joy_id']}, Axis {existing_binding['index']}")
             self.is_listening = False
     
+    def update_curve_widgets(self):
+        curve = self.curve_combo.currentData()
+        self.curve_amount_slider.setEnabled(curve in ("expo", "scurve"))
+        self.curve_points_edit.setEnabled(curve == "custom")
+    
     def update_axis_input(self, joy_id, axis_index, value):
         """Called by parent when axis input is detected"""
         if not self.is_listening:
@@ -1181,4 +1380,9 @@ class AxisConfigDialog(QDialog):
         self.binding_data["inverted"] = self.invert_cb.isChecked()
         self.binding_data["sensitivity"] = self.sensitivity_slider.value() / 100.0
         self.binding_data["deadzone"] = self.deadzone_slider.value() / 100.0
+        self.binding_data["saturation"] = self.saturation_slider.value() / 100.0
+        self.binding_data["hysteresis"] = self.hysteresis_slider.value() / 1000.0
+        self.binding_data["curve"] = self.curve_combo.currentData()
+        self.binding_data["curve_amount"] = self.curve_amount_slider.value() / 100.0
+        self.binding_data["curve_points"] = self.curve_points_edit.text().strip()
         return self.binding_data
\ No newline at end of file
@@ -111,4 +111,16 @@ CONTROL_DEFINITIONS = {
     "DEBUG_NORMALS":    {"type": "button", "style": "debug", "id": 26, "desc": "Toggle Debug Normals"},
     "DEBUG_TANGENTS":   {"type": "button", "style": "debug", "id": 27, "desc": "Toggle Debug Tangents"},
     "DEBUG_AABB":       {"type": "button", "style": "debug", "id": 28, "desc": "Toggle Debug AABB"},
-}
\ No newline at end of file
+}
+
+# Outbound priority lanes, most urgent first. When the link is busy, commands in an earlier lane are sent
+# before those in later lanes. A control's lane comes from LANE_OVERRIDES, else from its style, else "driving";
+# settings.command_lanes in config.json can remap controls or whole styles.
+COMMAND_LANES = ("safety", "driving", "cosmetic")
+LANE_BY_STYLE = {"brakes": "safety", "camera": "cosmetic", "debug": "cosmetic"}
+LANE_OVERRIDES = {
+    "EMERGENCY": "safety", "TRAIN_BRAKE": "safety", "INDEPENDENT_BRAKE": "safety", "ENGINE_BRAKE": "safety", "DYNAMIC_BRAKE": "safety",
+    "HORN": "safety", "BELL": "safety", "ALERTER": "safety",
+    "HUD": "cosmetic", "MAP": "cosmetic", "TRACK_MONITOR": "cosmetic", "TRAIN_DRIVING": "cosmetic", "SWITCH_PANEL": "cosmetic",
+    "TRAIN_OPERATIONS": "cosmetic", "TRAIN_DPU": "cosmetic", "NEXT_STATION": "cosmetic", "TRAIN_LIST": "cosmetic", "EOT_LIST": "cosmetic",
+}
@@ -1,84 +1,229 @@
 # hid_manager.py
+# HID switch panels (the Saitek Switch Panel and anything else described in panels/*.json).
+# A panel definition gives the USB ids, the report length and where each input lives, as [byte, bit]:
+#   "switches": {"NAME": [byte, bit], ...}                      independent on/off inputs
+#   "levers":   {"GEAR": {"GEAR_UP": [byte, bit], ...}, ...}     two-position levers, one input per end
+#   "groups":   {"ROTARY": {"DIAL_OFF": [byte, bit], ...}, ...}  mutually exclusive positions, first set bit wins
+# "debounce_ms" (default for every input) and "debounce": {"NAME": ms} set how long an input must hold a new
+# state before it counts; settings.hid_debounce_ms in config.json overrides both, by name or with "default".
+# An optional "prefix" is put in front of every input name so panels can't clash. All panels report through
+# saitek_changes with the same names their bindings use, so a new panel needs only a definition file.
 import hid
+import json
+import os
 import threading
+import time
 from PyQt5.QtCore import QObject, pyqtSignal
 
+# udev (Linux) tells us about plug/unplug as it happens; elsewhere the device list is polled
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+PANELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "panels")
+IDLE_READ_TIMEOUT_MS = 100
+HOTPLUG_POLL_INTERVAL = 0.5  # Device list poll without udev, and how soon a panel that dropped out is reopened
+
+
+def load_panel_definitions(directory=PANELS_DIR):
+    """Compile every *.json panel definition in directory. Returns (panels, errors)"""
+    panels = []; errors = []
+    try: file_names = sorted(f for f in os.listdir(directory) if f.lower().endswith(".json"))
+    except OSError as e: return panels, [f"{directory}: {e}"]
+    for file_name in file_names:
+        try:
+            with open(os.path.join(directory, file_name), 'r', encoding='utf-8') as f: panels.append(HIDPanel(json.load(f)))
+        except (OSError, ValueError, KeyError, TypeError) as e: errors.append(f"{file_name}: {e}")
+    return panels, errors
+
+
+class HIDPanel:
+    """One panel compiled from its definition. decode() keeps the previous report as an integer, XORs it with
+    the new one and looks up only the bits that flipped, so an unchanged report costs one comparison"""
+
+    def __init__(self, definition):
+        self.name = definition['name']; prefix = definition.get('prefix', '')
+        self.vendor_id = int(str(definition['vendor_id']), 0); self.product_id = int(str(definition['product_id']), 0)
+        self.report_length = int(definition.get('report_length', 8))
+        # Bit index is byte * 8 + bit, i.e. the bit's position in the report read as a little-endian integer
+        self.bit_table = {}; self.known_bits = 0; self.groups = {}
+        for name, position in definition.get('switches', {}).items(): self._add(prefix + name, position, 'switch')
+        for positions in definition.get('levers', {}).values():
+            for name, position in positions.items(): self._add(prefix + name, position, 'lever')
+        for group, positions in definition.get('groups', {}).items():
+            group = prefix + group; self.groups[group] = [(self._add(prefix + name, position, group), prefix + name) for name, position in positions.items()]
+        self.default_debounce_ms = float(definition.get('debounce_ms', 0)); self.debounce_ms = {prefix + name: float(ms) for name, ms in definition.get('debounce', {}).items()}
+        self.debounce_times = {}; self.debounced_bits = 0; self.set_debounce({})
+        self.device = None; self.thread = None; self.present = False; self.reset()
+
+    def reset(self):
+        """Forget all report history, e.g. when the device is (re)opened"""
+        self.last_report = None; self.last_states = {}; self.raw_report = None; self.stable_report = None; self.settle_at = {}
+
+    def resume(self):
+        """Keep the last known switch states across a reopen, so only switches moved while the panel was away are reported"""
+        self.raw_report = self.stable_report; self.settle_at = {}
+
+    def set_debounce(self, overrides):
+        """Per-input debounce from overrides ({name: ms, "default": ms}), then the definition's own settings"""
+        times = {}; debounced_bits = 0
+        for index, (name, kind) in self.bit_table.items():
+            ms = overrides.get(name, self.debounce_ms.get(name, overrides.get('default', self.default_debounce_ms)))
+            if ms > 0: times[1 << index] = ms / 1000.0; debounced_bits |= 1 << index
+        self.debounce_times = times; self.debounced_bits = debounced_bits
+
+    def _add(self, name, position, kind):
+        byte, bit = position; index = int(byte) * 8 + int(bit)
+        if index in self.bit_table: raise ValueError(f"{name} uses the same bit as {self.bit_table[index][0]}")
+        self.bit_table[index] = (name, kind); self.known_bits |= 1 << index
+        return 1 << index
+
+    def debounce(self, report, now):
+        """The report with bounces absorbed. A debounced bit takes a new value only once it has held it for its
+        debounce time; every edge restarts that bit's timer. Pass the previous raw report to settle timers without new input"""
+        if not self.debounced_bits or self.stable_report is None:
+            self.raw_report = self.stable_report = report; return report
+        changed = (report ^ self.raw_report) & self.debounced_bits; self.raw_report = report
+        while changed:
+            low = changed & -changed; changed ^= low; self.settle_at[low] = now + self.debounce_times[low]
+        stable = (self.stable_report & self.debounced_bits) | (report & ~self.debounced_bits)
+        for mask, deadline in list(self.settle_at.items()):
+            if now >= deadline: del self.settle_at[mask]; stable = (stable & ~mask) | (report & mask)
+        self.stable_report = stable
+        return stable
+
+    def read_timeout_ms(self, now):
+        """How long the reader may block: until the next debounce timer expires, or the idle timeout"""
+        if not self.settle_at: return IDLE_READ_TIMEOUT_MS
+        return max(1, min(IDLE_READ_TIMEOUT_MS, int((min(self.settle_at.values()) - now) * 1000) + 1))
+
+    def decode(self, report):
+        """[(name, "ON"/"OFF"), ...] for what changed in report (an integer) since the previous one; the first report gives every input"""
+        if report == self.last_report: return ()
+        changed = self.known_bits if self.last_report is None else (report ^ self.last_report) & self.known_bits
+        self.last_report = report; changes = []; changed_groups = []
+        while changed:
+            low = changed & -changed; changed ^= low
+            name, kind = self.bit_table[low.bit_length() - 1]
+            if kind in self.groups:
+                if kind not in changed_groups: changed_groups.append(kind)
+                continue
+            is_on = bool(report & low)
+            if self.last_states.get(name) != is_on: changes.append((name, "ON" if is_on else "OFF")); self.last_states[name] = is_on
+        for group in changed_groups:
+            current = next((name for mask, name in self.groups[group] if report & mask), None); last = self.last_states.get(group)
+            if current != last:
+                if last: changes.append((last, "OFF"))
+                if current: changes.append((current, "ON"))
+                self.last_states[group] = current
+        return changes
+
+
 class SaitekPanelManager(QObject):
-    saitek_event = pyqtSignal(str, str) # Emits switch_name, state ("ON" or "OFF")
-    
-    VENDOR_ID = 0x06A3
-    PRODUCT_ID = 0x0D67
-    # MAPPING CORRECTED based on user's direct observation of cyclical shift.
-    PANEL_MAPPING = { 
-        "BAT":        {'byte': 0, 'bit': 0}, "ALT":      {'byte': 0, 'bit': 1}, 
-        "AVIONICS":   {'byte': 0, 'bit': 2}, "FUEL PUMP":{'byte': 0, 'bit': 3}, 
-        "DE-ICE":     {'byte': 0, 'bit': 4}, "PITOT HEAT":{'byte': 0, 'bit': 5}, 
-        "COWL":       {'byte': 0, 'bit': 6}, "PANEL":    {'byte': 0, 'bit': 7}, 
-        "BEACON":     {'byte': 1, 'bit': 0}, "NAV":      {'byte': 1, 'bit': 1}, 
-        "STROBE":     {'byte': 1, 'bit': 2}, "TAXI":     {'byte': 1, 'bit': 3}, 
-        "LANDING":    {'byte': 1, 'bit': 4}, 
-        "DIAL_OFF":   {'byte': 2, 'bit': 1}, # Was START's position
-        "DIAL_R":     {'byte': 1, 'bit': 5}, # Was OFF's position
-        "DIAL_L":     {'byte': 1, 'bit': 6}, # Was R's position
-        "DIAL_BOTH":  {'byte': 1, 'bit': 7}, # Was L's position
-        "DIAL_START": {'byte': 2, 'bit': 0}, # Was BOTH's position
-        "GEAR_UP":    {'byte': 2, 'bit': 2}, "GEAR_DOWN":{'byte': 2, 'bit': 3}
-    }
-    SWITCH_NAMES = ["BAT", "ALT", "AVIONICS", "FUEL PUMP", "DE-ICE", "PITOT HEAT", "COWL", "PANEL", "BEACON", "NAV", "STROBE", "TAXI", "LANDING"]
-    ROTARY_POSITIONS = ["DIAL_OFF", "DIAL_R", "DIAL_L", "DIAL_BOTH", "DIAL_START"]
-    
-    def __init__(self, parent=None):
-        super().__init__(parent); self.device = None; self.running = False; self.thread = None
-        self.stop_event = threading.Event(); self.last_states = {}
+    saitek_changes = pyqtSignal(float, list) # Emits time.monotonic() of the report, [(switch_name, "ON"/"OFF"), ...] - one per changed report
+    devices_changed = pyqtSignal() # A panel was plugged in or unplugged
+
+    def __init__(self, parent=None, panels_dir=PANELS_DIR):
+        super().__init__(parent); self.running = False  # running: the user wants the panels read, whether or not one is plugged in right now
+        self.stop_event = threading.Event(); self.lock = threading.Lock()
+        self.monitor_thread = None; self.monitor_stop = threading.Event()
+        self.panels, self.load_errors = load_panel_definitions(panels_dir)
+        self.refresh_presence()
+
+    def configure_debounce(self, overrides):
+        """Debounce times in ms by input name, plus "default"; see the module comment"""
+        overrides = {name: float(ms) for name, ms in (overrides or {}).items()}
+        for panel in self.panels: panel.set_debounce(overrides)
+
+    def connected_panels(self):
+        """Panels plugged in as last seen by the hotplug monitor; never touches the USB stack"""
+        return [panel for panel in self.panels if panel.present]
 
     def is_connected(self):
-        try:
-            if hid.enumerate(self.VENDOR_ID, self.PRODUCT_ID): return True
-        except hid.HIDException: pass
-        return False
+        return any(panel.present for panel in self.panels)
+
+    def refresh_presence(self):
+        """Re-enumerate HID devices and update which panels are present. True if that changed"""
+        try: found = {(d['vendor_id'], d['product_id']) for d in hid.enumerate()}
+        except hid.HIDException: return False
+        changed = False
+        for panel in self.panels:
+            present = (panel.vendor_id, panel.product_id) in found
+            if present != panel.present: panel.present = present; changed = True
+        return changed
 
     def start_listening(self):
-        if self.running: return True
-        try:
-            self.device = hid.device(); self.device.open(self.VENDOR_ID, self.PRODUCT_ID)
-            self.running = True; self.stop_event.clear()
-            self.thread = threading.Thread(target=self.read_loop, daemon=True); self.thread.start()
-            return True
-        except (IOError, hid.HIDException, ValueError): self.device = None; return False
+        """Open every connected panel and read each on its own thread. True if at least one is open; either way the
+        hotplug monitor keeps opening panels as they become available until stop_listening()"""
+        if not self.running: self.running = True; self.stop_event.clear()
+        opened = [self._open(panel) for panel in self.connected_panels()]
+        return any(opened)
 
     def stop_listening(self):
         if not self.running: return
         self.running = False; self.stop_event.set()
-        if self.thread: self.thread.join(timeout=1)
-        if self.device: self.device.close()
+        for panel in self.panels:
+            if panel.thread: panel.thread.join(timeout=1); panel.thread = None
 
-    def is_bit_set(self, data, alias):
-        m = self.PANEL_MAPPING.get(alias)
-        if m and m['byte'] < len(data): return (data[m['byte']] & (1 << m['bit'])) != 0
-        return False
+    def _open(self, panel, resume=False):
+        with self.lock:
+            if panel.device is not None: return True
+            try: device = hid.device(); device.open(panel.vendor_id, panel.product_id)
+            except (IOError, hid.HIDException, ValueError): return False
+            if resume: panel.resume()
+            else: panel.reset()
+            panel.device = device; panel.thread = threading.Thread(target=self.read_loop, args=(panel, device), daemon=True); panel.thread.start()
+            return True
 
-    def read_loop(self):
+    def read_loop(self, panel, device):
+        # Bounces are absorbed here, on the reader thread, before they cost a cross-thread hop or any network traffic.
+        # A read error (usually the panel being unplugged) just ends this reader; the hotplug monitor reopens the panel
         while not self.stop_event.is_set():
             try:
-                data = self.device.read(8, timeout_ms=100)
-                if data: self.handle_input(data)
-            except (hid.HIDException, ValueError):
-                self.stop_event.set(); self.running = False
-        if self.device: self.device.close(); self.device = None
-            
-    def handle_input(self, data):
-        for name in self.SWITCH_NAMES:
-            is_on = self.is_bit_set(data, name)
-            if self.last_states.get(name) != is_on: self.saitek_event.emit(name, "ON" if is_on else "OFF"); self.last_states[name] = is_on
-        is_up = self.is_bit_set(data, "GEAR_UP"); is_down = self.is_bit_set(data, "GEAR_DOWN")
-        if is_up != self.last_states.get("GEAR_UP"): self.saitek_event.emit("GEAR_UP", "ON" if is_up else "OFF"); self.last_states["GEAR_UP"] = is_up
-        if is_down != self.last_states.get("GEAR_DOWN"): self.saitek_event.emit("GEAR_DOWN", "ON" if is_down else "OFF"); self.last_states["GEAR_DOWN"] = is_down
-        current_rotary = next((pos for pos in self.ROTARY_POSITIONS if self.is_bit_set(data, pos)), None)
-        last_rotary = self.last_states.get("ROTARY")
-        if current_rotary != last_rotary:
-            if last_rotary: self.saitek_event.emit(last_rotary, "OFF")
-            if current_rotary: self.saitek_event.emit(current_rotary, "ON")
-            self.last_states["ROTARY"] = current_rotary
-            
+                data = device.read(panel.report_length, timeout_ms=panel.read_timeout_ms(time.monotonic()))
+                if data: self.handle_input(panel, int.from_bytes(bytes(data), 'little'))
+                elif panel.settle_at: self.handle_input(panel, panel.raw_report)  # A debounce timer ran out with no new report
+            except (hid.HIDException, ValueError, OSError):
+                break
+        with self.lock:
+            if panel.device is device: panel.device = None
+        try: device.close()
+        except (hid.HIDException, OSError): pass
+
+    def start_monitor(self):
+        """Watch for panels being plugged in or unplugged, and reopen listened-to panels when they come back"""
+        if self.monitor_thread: return
+        self.monitor_stop.clear(); self.monitor_thread = threading.Thread(target=self.monitor_loop, name="HIDHotplug", daemon=True); self.monitor_thread.start()
+
+    def monitor_loop(self):
+        monitor = None
+        if pyudev is not None:
+            try:
+                monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                monitor.filter_by('hidraw'); monitor.filter_by('usb'); monitor.start()  # hidapi uses hidraw or libusb
+            except Exception: monitor = None
+        while not self.monitor_stop.is_set():
+            if monitor is not None:
+                # Only enumerate when udev reports something; a burst of events (one per interface) is one refresh
+                event = monitor.poll(timeout=HOTPLUG_POLL_INTERVAL); enumerate_devices = event is not None
+                while event is not None: event = monitor.poll(timeout=0)
+            else:
+                self.monitor_stop.wait(HOTPLUG_POLL_INTERVAL); enumerate_devices = True
+            if self.monitor_stop.is_set(): break
+            if enumerate_devices and self.refresh_presence(): self.devices_changed.emit()
+            if self.running:
+                for panel in self.panels:
+                    if panel.present and panel.device is None: self._open(panel, resume=True)
+
+    def stop_monitor(self):
+        self.monitor_stop.set()
+        if self.monitor_thread: self.monitor_thread.join(timeout=1); self.monitor_thread = None
+
+    def handle_input(self, panel, report):
+        # One emit per report, so a dial move (old position OFF, new one ON) crosses threads as one change-set
+        now = time.monotonic(); changes = panel.decode(panel.debounce(report, now))
+        if changes: self.saitek_changes.emit(now, changes)
+
     def shutdown(self):
-        self.stop_listening()
\ No newline at end of file
+        self.stop_monitor(); self.stop_listening()
@@ -0,0 +1,347 @@
+# input_router.py
+# Headless input routing engine. Turns raw device events into outbound
+# commands for Open Rails and owns the control state that used to be read
+# back from the Qt widgets: which controls are enabled, slider positions and
+# ranges, toggle states and the stepped-slider bookkeeping.
+# There is no Qt in here. The GUI registers an observer and mirrors state
+# changes into its widgets, so routing can run (and be exercised) without a
+# QApplication.
+import time
+from definitions import CONTROL_DEFINITIONS
+from binding_model import build_binding_model, EMPTY_CONTROL, NEUTRAL_STEPS
+from binding_index import build_joystick_index, build_saitek_index
+
+AXIS_MAX_THRESHOLD = 0.95  # Only used to flag full deflection in the debug log
+ALWAYS_ENABLED = ('HORN', 'BELL')  # Sent as values, so they work even if the switch panel doesn't list them
+SERVER_TYPE_NAMES = {'GEAR': ('GEAR', 'GEARS')}  # CABCONTROLS TypeNames of stepped sliders whose name differs from ours
+
+
+class InputRouter:
+    """Routes device input to Open Rails commands.
+
+    sender must provide send_ws_click(command_id), send_step_clicks(decrease_id,
+    increase_id, delta), send_button_event(command_id, event_type),
+    send_control_value(control_name, value) for analog values,
+    send_button_value(control_name, value) for on/off values that must all
+    arrive in order, step_clicks_pending(decrease_id, increase_id) and a
+    batch() context manager that sends the analog values of one dispatch
+    tick together. Observers are
+    called as observer(kind, control_id, value) with kind one of 'enabled',
+    'range', 'value', 'checked' or 'setting'.
+    """
+
+    def __init__(self, sender, log=None):
+        self.sender = sender
+        self.log = log or (lambda text, source: None)
+        self.observers = []
+        self.workaround_handler = None  # handler(control_id, binding_type, value, control)
+        self.model = {}; self.joystick_index = {}; self.saitek_index = {}
+        self.enabled = set(); self.checked = {}; self.active_slider_names = set()
+        self.ranges = {cid: tuple(d['range']) for cid, d in CONTROL_DEFINITIONS.items() if d['type'] == 'slider'}
+        self.values = {cid: min(max(0, lo), hi) for cid, (lo, hi) in self.ranges.items()}
+        self.step_positions = {}  # Position of each stepped slider: as reported by the server, or where our clicks will put it
+        self.active_step_buttons = {}  # control_id -> {step: True} for 3-way switch neutral detection
+        self.combined_mode = False; self.invert_combined = False
+        self.button_states = {}; self.saitek_states = {}
+        self.last_input_time = None  # time.monotonic() of the device event being dispatched
+        self.virtual_handlers = {"TOGGLE_COMBINED_THROTTLE": self._setting_toggle('combined_mode'), "TOGGLE_INVERT_COMBINED": self._setting_toggle('invert_combined')}
+
+    # --- State ---
+
+    def notify(self, kind, control_id, value):
+        for observer in self.observers: observer(kind, control_id, value)
+
+    def set_bindings(self, bindings):
+        """Rebuild the typed binding model and the input lookup tables"""
+        self.model = build_binding_model(bindings)
+        self.joystick_index = build_joystick_index(self.model); self.saitek_index = build_saitek_index(self.model)
+
+    def register_virtual_handlers(self, handlers):
+        self.virtual_handlers.update(handlers)
+
+    def missing_virtual_handlers(self):
+        return [cid for cid, d in CONTROL_DEFINITIONS.items() if d.get('behavior') == 'virtual' and cid not in self.virtual_handlers]
+
+    def reset_steps(self):
+        # Step positions describe the sim's levers, not the profile, so they survive a profile change
+        self.active_step_buttons.clear()
+
+    def set_setting(self, name, enabled):
+        if name not in ('combined_mode', 'invert_combined'): return
+        setattr(self, name, bool(enabled)); self.notify('setting', name, bool(enabled))
+
+    def set_combined_mode(self, enabled): self.set_setting('combined_mode', enabled)
+
+    def set_invert_combined(self, enabled): self.set_setting('invert_combined', enabled)
+
+    def _set_enabled(self, control_id, enabled):
+        if (control_id in self.enabled) == enabled: return
+        if enabled: self.enabled.add(control_id)
+        else: self.enabled.discard(control_id)
+        self.notify('enabled', control_id, enabled)
+
+    def _set_range(self, control_id, new_range):
+        self.ranges[control_id] = new_range; lo, hi = new_range
+        self.values[control_id] = min(max(self.values.get(control_id, lo), lo), hi)
+        self.notify('range', control_id, new_range)
+
+    def _set_value(self, control_id, value):
+        self.values[control_id] = value; self.notify('value', control_id, value)
+
+    def _set_checked(self, control_id, checked):
+        self.checked[control_id] = checked; self.notify('checked', control_id, checked)
+
+    def on_connection_changed(self, is_connected, server_active_button_ids):
+        """Enable the controls the server's switch panel knows about, or everything off on disconnect"""
+        if not is_connected:
+            for control_id in list(self.enabled): self._set_enabled(control_id, False)
+            return
+        server_active_button_ids = set(server_active_button_ids); self._set_enabled('COMBINED_THROTTLE', True)
+        for our_id, definition in CONTROL_DEFINITIONS.items():
+            if our_id == 'COMBINED_THROTTLE' or definition.get('behavior') == 'virtual': continue
+            if our_id in ALWAYS_ENABLED: self._set_enabled(our_id, True); continue
+            if 'id' in definition:
+                command_id = definition.get('id')
+                is_active = any(sub_id in server_active_button_ids for sub_id in command_id) if isinstance(command_id, list) else command_id in server_active_button_ids
+                self._set_enabled(our_id, is_active)
+
+    def on_cab_controls(self, server_data):
+        """Enable and re-range the analog sliders from a /API/CABCONTROLS response"""
+        self.active_slider_names = {control['TypeName'] for control in server_data}
+        if not server_data: return
+        by_name = {control['TypeName']: control for control in server_data}
+        for control_id, definition in CONTROL_DEFINITIONS.items():
+            if definition.get('type') != 'slider' or 'id' in definition: continue
+            control_data = by_name.get(control_id)
+            if control_data is None: self._set_enabled(control_id, False); continue
+            self._set_enabled(control_id, True)
+            min_val_f, max_val_f = control_data['MinValue'], control_data['MaxValue']
+            self._set_range(control_id, (0, 100) if max_val_f == 1.0 and min_val_f == 0.0 else (int(min_val_f), int(max_val_f)))
+
+    def on_cab_values(self, server_data):
+        """Reconcile stepped sliders with the positions in a /API/CABCONTROLS response"""
+        by_name = {control.get('TypeName'): control for control in server_data}
+        for control_id, definition in CONTROL_DEFINITIONS.items():
+            if definition.get('type') != 'slider' or 'id' not in definition: continue
+            # Ignored while our own clicks on it are still on their way; the reading taken when they are all sent counts
+            if self.sender.step_clicks_pending(*definition['id']): continue
+            control_data = next((by_name[name] for name in SERVER_TYPE_NAMES.get(control_id, (control_id,)) if name in by_name), None)
+            step = self._server_step(control_id, control_data) if control_data else None
+            if step is None or step == self.step_positions.get(control_id): continue
+            self.log(f"{control_id}: server reports step {step} (assumed {self.step_positions.get(control_id)})", "DEBUG")
+            self.step_positions[control_id] = step; self._set_value(control_id, step)
+
+    def _server_step(self, control_id, control_data):
+        min_val, max_val = self.ranges[control_id]
+        try:
+            if 'Value' in control_data: step = round(float(control_data['Value']))
+            elif 'RangeFraction' in control_data: step = round(min_val + float(control_data['RangeFraction']) * (max_val - min_val))
+            else: return None
+        except (TypeError, ValueError): return None
+        return min(max(step, min_val), max_val)
+
+    # --- Device input ---
+
+    def handle_joystick_events(self, events):
+        """Dispatch one poll's worth of (joy_id, type, index, value, timestamp) events; their values are sent as one batch"""
+        with self.sender.batch():
+            for event in events: self.handle_joystick_event(*event)
+
+    def handle_joystick_event(self, joy_id, type, index, value, timestamp=None):
+        self.last_input_time = timestamp if timestamp is not None else time.monotonic()
+        actions = self.joystick_index.get((joy_id, type, index), ())
+        if type == 'axis':
+            percentage = ((value + 1) / 2.0) * 100; at_max = "⚠ AT MAX" if abs(value) >= AXIS_MAX_THRESHOLD else ""
+            bound_to = actions[0][0] if actions else "UNBOUND"
+            self.log(f"[AXIS RAW] Joy{joy_id} Axis{index} → {bound_to}: Raw={value:.6f} ({percentage:.2f}%) {at_max}", "DEBUG")
+        if type == 'button':
+            key = (joy_id, index); old_state = self.button_states.get(key, 0.0); self.button_states[key] = value
+            if old_state == 1.0 and value == 0.0: self._handle_joystick_release(actions)
+        if type == 'button' and value == 1.0:
+            for control_id, binding_type, override, step in actions:
+                if binding_type == 'button' and control_id in self.virtual_handlers:
+                    self.log(f"Virtual control button detected: {control_id} from Joy{joy_id} Btn{index}", "BINDING"); self.execute_binding(control_id, 'button', 1.0); return
+        if self.combined_mode:
+            binding = self.model.get("COMBINED_THROTTLE", EMPTY_CONTROL).axis
+            if binding and binding.joy_id == joy_id and binding.index == index and type == 'axis':
+                brake_type = "TRAIN_BRAKE"
+                if 'DYNAMIC_BRAKE' in self.active_slider_names and 'TRAIN_BRAKE' not in self.active_slider_names: brake_type = 'DYNAMIC_BRAKE'
+                if binding.inverted: value = -value
+                value = binding.filter.apply(value)
+                if value is None: return
+                if self.invert_combined: value = -value
+                self.handle_combined_brake_logic(brake_type, value); return
+        for control_id, binding_type, override, step in actions:
+            if binding_type == 'values':
+                if value == 1.0:
+                    self.log(f"Button {index} pressed → {control_id} step {step}", "DEBUG")
+                    self.execute_step_binding(control_id, step)
+                    return
+                continue
+            self.execute_binding(control_id, binding_type, value, override)
+
+    def _handle_joystick_release(self, actions):
+        # A toggle_on_press override on any button binding of a control suppresses its whole release
+        skipped = {control_id for control_id, binding_type, override, step in actions if binding_type == 'button' and override == 'toggle_on_press'}
+        for control_id in skipped: self.log(f"Ignoring button release for {control_id} due to toggle_on_press override", "BINDING")
+        released_steps = set(); workaround_released = set()
+        for control_id, binding_type, override, step in actions:
+            if control_id in skipped: continue
+            if binding_type == 'button':
+                # WORKAROUND HOLD: Process release events for workaround controls
+                if self.model.get(control_id, EMPTY_CONTROL).use_workaround and control_id not in workaround_released:
+                    workaround_released.add(control_id); self.execute_binding(control_id, 'button', 0.0)
+            elif binding_type == 'off_button':
+                self.execute_binding(control_id, 'off_button', 0.0); self.log(f"Switch OFF detected: {control_id}", "BINDING")
+            elif binding_type == 'values' and (control_id, step) not in released_steps:
+                released_steps.add((control_id, step)); self.release_step_binding(control_id, step)
+
+    def handle_saitek_changes(self, timestamp, changes):
+        """Dispatch the [(switch, state), ...] decoded from one HID report as one unit: its values are sent as one batch"""
+        self.last_input_time = timestamp
+        with self.sender.batch():
+            for switch, state in changes: self._handle_saitek_change(switch, state)
+
+    def _handle_saitek_change(self, switch, state):
+        self.saitek_states[switch] = state
+        self.log(f"🎛️ Saitek: {switch} → {state}", "SAITEK")
+        # For Saitek switches, always pass the correct value based on state
+        # ON = 1.0, OFF = 0.0 (even for off_button bindings)
+        value_to_send = 1.0 if state == "ON" else 0.0
+        for control_id, binding_type, override, step in self.saitek_index.get((switch, state), ()):
+            # Handle stepped values (3-way switches, etc.)
+            if binding_type == 'values':
+                self.log(f"  ✓ Matched stepped binding: {control_id} step={step}", "SAITEK")
+                self.execute_step_binding(control_id, step)
+                return
+            self.log(f"  ✓ Executing: {control_id}.{binding_type} with value={value_to_send}", "SAITEK")
+            self.execute_binding(control_id, binding_type, value_to_send)
+
+    # --- Dispatch ---
+
+    def _setting_toggle(self, name):
+        def handler(binding_type, value, control):
+            if binding_type == "button" and value == 1.0: self.set_setting(name, True)
+            elif binding_type == "off_button" and value == 0.0: self.set_setting(name, False)
+            elif binding_type == "button" and value == 0.0 and not control.has('off_button'): self.set_setting(name, not getattr(self, name))
+        return handler
+
+    def _move_step(self, control_id, target_value):
+        """Click a stepped slider from its known position to target_value"""
+        delta = target_value - self.step_positions.get(control_id, self.values[control_id])
+        self.step_positions[control_id] = target_value
+        if not delta: return
+        decrease_id, increase_id = CONTROL_DEFINITIONS[control_id]['id']
+        self.sender.send_step_clicks(decrease_id, increase_id, delta)
+
+    def execute_binding(self, control_id, binding_type, value, override=None):
+        control = self.model.get(control_id, EMPTY_CONTROL)
+        if control.use_workaround and value >= 0.0:  # Workaround handles both press (1.0) and release (0.0)
+            if self.workaround_handler: self.workaround_handler(control_id, binding_type, value, control)
+            return
+        virtual_handler = self.virtual_handlers.get(control_id)
+        if virtual_handler is not None: virtual_handler(binding_type, value, control); return
+        if control_id not in self.enabled: return
+        definition = CONTROL_DEFINITIONS[control_id]
+        if definition['type'] == 'slider':
+            if not control.has(binding_type): return
+            if binding_type == 'axis':
+                binding = control.axis
+                if binding.inverted: value = -value
+                min_val, max_val = self.ranges[control_id]
+                if 'id' in definition:
+                    target_value = int(min_val + ((value + 1) / 2) * (max_val - min_val))
+                    self._move_step(control_id, target_value)
+                    self._set_value(control_id, target_value)
+                else:
+                    value = binding.filter.apply(value)
+                    if value is None: return  # Within hysteresis or no change after shaping
+                    range_fraction = (value + 1) / 2.0; self.sender.send_control_value(control_id, range_fraction)
+                    self._set_value(control_id, int(min_val + range_fraction * (max_val - min_val)))
+            elif binding_type in ["increase", "decrease"] and value == 1.0:
+                if control.incremental_mode:
+                    min_val, max_val = self.ranges[control_id]
+                    new_val = max(min_val, min(max_val, self.values[control_id] + (1 if binding_type == 'increase' else -1)))
+                    self.set_slider_value(control_id, new_val); self.notify('value', control_id, new_val)
+        elif definition['type'] == 'button':
+            command_id = definition.get('id')
+            if command_id is None: return
+            # OVERRIDE: Toggle on Press
+            if override == 'toggle_on_press':
+                if value == 1.0:  # Press event only
+                    self.sender.send_ws_click(command_id)
+                    self._set_checked(control_id, not self.checked.get(control_id, False))
+                return  # Skip standard processing
+            if definition.get("send_as") == "value": self.sender.send_button_value(control_id, value); self._set_checked(control_id, value == 1.0); return
+            behavior = definition.get("behavior")
+            if behavior == "toggle":
+                # - Momentary button (joystick): bound to 'button' only, fires on press (value=1.0)
+                # - Maintained switch (Saitek): bound to 'button' (ON) AND 'off_button' (OFF)
+                if (binding_type == 'button' and value == 1.0) or (binding_type == 'off_button'):
+                    self.sender.send_ws_click(command_id)
+                    self.log(f"✓ Toggle click sent for {control_id} (type={binding_type}, value={value})", "BIND")
+                # Reflect the physical input's state
+                self._set_checked(control_id, value == 1.0)
+            elif behavior == "hold":
+                event = "buttonDown" if value == 1.0 else "buttonUp"
+                self.sender.send_button_event(command_id, event)
+                self.log(f"✓ Hold event sent for {control_id}: {event} (value={value})", "BIND")
+                self._set_checked(control_id, value == 1.0)
+            elif value == 1.0: self.sender.send_ws_click(command_id)
+
+    def execute_step_binding(self, control_id, target_step):
+        """Execute a stepped slider binding (for 3-way switches, etc.)"""
+        if control_id not in self.enabled: return
+        definition = CONTROL_DEFINITIONS[control_id]
+        if 'id' not in definition or definition.get('type') != 'slider': return
+        try: target_value = int(target_step)
+        except (ValueError, TypeError): self.log(f"Invalid step value '{target_step}' for {control_id}", "ERROR"); return
+        # For 3-way switches only ONE position can be active at a time
+        control_steps = self.active_step_buttons.setdefault(control_id, {})
+        control_steps.clear(); control_steps[target_value] = True
+        self.log(f"{control_id}: Button pressed for step {target_value}, cleared other steps", "DEBUG")
+        self._move_step(control_id, target_value)
+        self._set_value(control_id, target_value); self.log(f"Set {control_id} to step {target_value}", "BINDING")
+
+    def release_step_binding(self, control_id, step):
+        """Handle button release for stepped sliders - return to neutral once every step button is up"""
+        if not self.active_step_buttons: return
+        control_steps = self.active_step_buttons.get(control_id, {})
+        if step in control_steps:
+            del control_steps[step]
+            self.log(f"{control_id}: Released step {step}, remaining active: {list(control_steps.keys())}", "DEBUG")
+        if not control_steps:
+            self.log(f"{control_id}: All buttons released, returning to NEUTRAL (step 0)", "BINDING")
+            neutral_step = NEUTRAL_STEPS.get(control_id)
+            if neutral_step is not None: self.execute_step_binding(control_id, neutral_step)
+
+    def handle_combined_brake_logic(self, brake_type, value):
+        if value >= 0: self.sender.send_control_value("THROTTLE", value); self.sender.send_control_value(brake_type, 0.0); throttle_display = int(value * 100); brake_display = 0; combined_display = int(value * 100)
+        else: brake_fraction = -value; self.sender.send_control_value("THROTTLE", 0.0); self.sender.send_control_value(brake_type, brake_fraction); throttle_display = 0; brake_display = int(brake_fraction * 100); combined_display = -int(brake_fraction * 100)
+        self._set_value("THROTTLE", throttle_display); self._set_value(brake_type, brake_display); self._set_value("COMBINED_THROTTLE", combined_display)
+
+    # --- GUI-originated input ---
+
+    def set_slider_value(self, control_id, value):
+        """Send a slider position chosen in the GUI (or by an incremental binding)"""
+        definition = CONTROL_DEFINITIONS[control_id]
+        if 'id' in definition:
+            self._move_step(control_id, value)
+        else:
+            min_val, max_val = self.ranges[control_id]; range_size = max_val - min_val
+            self.sender.send_control_value(control_id, (value - min_val) / range_size if range_size > 0 else 0)
+        self.values[control_id] = value
+
+    def click(self, control_id):
+        command_id = CONTROL_DEFINITIONS[control_id].get('id')
+        if command_id is not None: self.sender.send_ws_click(command_id)
+
+    def set_checked(self, control_id, is_checked):
+        """A checkable GUI button was toggled"""
+        definition = CONTROL_DEFINITIONS[control_id]; command_id = definition.get('id')
+        self.checked[control_id] = is_checked
+        if command_id is None: return
+        if definition.get("send_as") == "value": self.sender.send_button_value(control_id, 1.0 if is_checked else 0.0); return
+        behavior = definition.get("behavior")
+        if behavior == "toggle": self.sender.send_ws_click(command_id)
+        elif behavior == "hold": self.sender.send_button_event(command_id, "buttonDown" if is_checked else "buttonUp")
@@ -0,0 +1,100 @@
+# input_thread.py
+# Optional dedicated input thread. Joystick polling and binding dispatch run
+# here instead of on the GUI thread, so repaints, modal dialogs and a busy
+# debug log can't delay throttle and brake commands.
+# Work for the router (Saitek events, GUI input, connection updates) is posted
+# into the thread's inbox. Router state changes and log lines travel the other
+# way through a bounded queue that the GUI drains once per frame; if the GUI
+# falls so far behind that the queue fills, updates are dropped and the GUI is
+# told to resync from the router instead of blocking input.
+import queue
+import threading
+import time
+
+UI_QUEUE_SIZE = 4096
+THREAD_PRIORITY_HIGHEST = 2  # winbase.h
+
+
+def _raise_thread_priority():
+    try:
+        import win32api, win32process
+        win32process.SetThreadPriority(win32api.GetCurrentThread(), THREAD_PRIORITY_HIGHEST)
+    except Exception: pass  # Not on Windows or pywin32 missing: run at normal priority
+
+
+class InputThread(threading.Thread):
+    """Polls devices and runs InputRouter dispatch at a fixed interval.
+
+    poll() must return [(joy_id, type, index, value, timestamp), ...]. Everything that
+    touches the router from other threads goes through post(). setup() and
+    teardown() run on the thread before the first poll and after the last, for
+    libraries that must be driven from the thread that initialised them (SDL).
+    """
+
+    def __init__(self, router, poll, poll_interval=0.01, ui_queue_size=UI_QUEUE_SIZE, setup=None, teardown=None):
+        super().__init__(name="InputThread", daemon=True)
+        self.router = router; self.poll = poll; self.poll_interval = poll_interval; self.setup = setup; self.teardown = teardown
+        self.inbox = queue.SimpleQueue()
+        self.ui_queue = queue.Queue(maxsize=ui_queue_size)  # ('state', kind, control_id, value) / ('log', text, source)
+        self.ui_calls = queue.SimpleQueue()  # (fn, args) that must run on the GUI thread; never dropped
+        self.overflowed = False
+        self.running = False
+        router.observers = [lambda kind, control_id, value: self.post_ui(('state', kind, control_id, value))]
+        router.log = lambda text, source: self.post_ui(('log', text, source))
+
+    def post(self, fn, *args):
+        """Run fn(*args) on the input thread"""
+        self.inbox.put((fn, args))
+
+    def post_ui(self, item):
+        try: self.ui_queue.put_nowait(item)
+        except queue.Full: self.overflowed = True
+
+    def in_gui(self, fn):
+        """Wrap fn so calling it from the input thread runs it on the GUI thread instead"""
+        def call(*args): self.ui_calls.put((fn, args))
+        return call
+
+    def drain_ui(self):
+        """Take everything queued for the GUI: (items, calls, overflowed)"""
+        items = []; calls = []
+        try:
+            while True: items.append(self.ui_queue.get_nowait())
+        except queue.Empty: pass
+        try:
+            while True: calls.append(self.ui_calls.get_nowait())
+        except queue.Empty: pass
+        overflowed = self.overflowed; self.overflowed = False
+        return items, calls, overflowed
+
+    def start(self):
+        self.running = True; super().start()
+
+    def stop(self):
+        self.running = False; self.post(lambda: None)
+        if self.is_alive(): self.join(timeout=1.0)
+
+    def _call(self, fn, args):
+        try: fn(*args)
+        except Exception as e: self.post_ui(('log', f"Input thread error in {getattr(fn, '__name__', fn)}: {e}", "ERROR"))
+
+    def run(self):
+        _raise_thread_priority()
+        if self.setup: self._call(self.setup, ())
+        try: self._loop()
+        finally:
+            if self.teardown: self._call(self.teardown, ())
+
+    def _loop(self):
+        next_poll = time.monotonic()
+        while self.running:
+            timeout = next_poll - time.monotonic()
+            if timeout > 0:
+                try: fn, args = self.inbox.get(timeout=timeout)
+                except queue.Empty: continue
+                self._call(fn, args); continue
+            now = time.monotonic(); next_poll += self.poll_interval
+            if next_poll < now: next_poll = now + self.poll_interval  # Fell behind: don't try to catch up with a burst of polls
+            try: events = self.poll()
+            except Exception as e: self.post_ui(('log', f"Input thread poll error: {e}", "ERROR")); continue
+            if events: self._call(self.router.handle_joystick_events, (events,))
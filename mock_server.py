@@ -0,0 +1,321 @@
+# mock_server.py
+# Local stand-in for the Open Rails web server, for exercising and benchmarking
+# OpenRailsWebInterface without the sim. Standard library only, so it runs on
+# any box with Python 3.8+.
+#
+# Speaks the two APIs the app uses:
+#   ws://host:port/switchpanel        - 'init' layout, 'buttonDown'/'buttonUp'
+#   http://host:port/API/CABCONTROLS  - GET the cab layout, POST control values
+#
+# Every request is recorded with its wall-clock receive time (time.time(), so it
+# can be compared with timestamps logged by the app on the same machine). Delays,
+# jitter and faults (HTTP errors, dropped connections, WebSocket drops and stalls,
+# cab changes) can be injected from the command line.
+#
+#   python mock_server.py --layout full --layout diesel --cab-change-every 30 --record events.jsonl
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+from definitions import CONTROL_DEFINITIONS
+
+DEFAULT_PORT = 2150
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+MAX_FRAME = 1 << 20
+STEP_SERVER_NAMES = {'GEAR': 'GEARS'}  # Open Rails reports some stepped controls under a different TypeName
+
+
+def build_layout(exclude_styles=()):
+    """Cab layout from CONTROL_DEFINITIONS: {'commands': [ids], 'controls': [CABCONTROLS entries]}.
+
+    Stepped sliders carry their [decrease, increase] command ids in 'StepCommands'
+    so clicks move them; that key is stripped from GET responses.
+    """
+    commands = []; controls = []
+    for control_id, definition in CONTROL_DEFINITIONS.items():
+        if definition.get('behavior') == 'virtual' or definition.get('style') in exclude_styles: continue
+        ids = definition.get('id')
+        if ids is not None: commands.extend(ids if isinstance(ids, list) else [ids])
+        if definition['type'] != 'slider' or control_id == 'COMBINED_THROTTLE': continue
+        if ids is None: controls.append({"TypeName": control_id, "MinValue": 0.0, "MaxValue": 1.0, "RangeFraction": 0.0})
+        else:
+            min_val, max_val = definition['range']
+            controls.append({"TypeName": STEP_SERVER_NAMES.get(control_id, control_id), "MinValue": float(min_val), "MaxValue": float(max_val),
+                             "RangeFraction": (0 - min_val) / (max_val - min_val) if min_val <= 0 <= max_val else 0.0, "StepCommands": list(ids)})
+    for control_id, definition in CONTROL_DEFINITIONS.items():
+        if definition.get('send_as') == 'value' and definition.get('style') not in exclude_styles:
+            controls.append({"TypeName": control_id, "MinValue": 0.0, "MaxValue": 1.0, "RangeFraction": 0.0})
+    return {"commands": sorted(set(commands)), "controls": controls}
+
+
+BUILTIN_LAYOUTS = {
+    'full': lambda: build_layout(),
+    'electric': lambda: build_layout(exclude_styles=('engine_diesel',)),
+    'diesel': lambda: build_layout(exclude_styles=('engine_electric',)),
+}
+
+
+def load_layout(spec):
+    """A built-in layout name or a path to a JSON file in the same format as build_layout()"""
+    if spec in BUILTIN_LAYOUTS: return BUILTIN_LAYOUTS[spec]()
+    with open(spec, 'r', encoding='utf-8') as f: layout = json.load(f)
+    layout.setdefault('commands', []); layout.setdefault('controls', [])
+    return layout
+
+
+class MockOpenRailsServer:
+    """Serves /switchpanel and /API/CABCONTROLS on one port and records what it receives.
+
+    events is a list of dicts with at least 't' (receive time, time.time()) and
+    'kind'. Faults are drawn from a seeded random.Random so runs are repeatable.
+    """
+
+    def __init__(self, layouts, http_delay=0.0, ws_delay=0.0, jitter=0.0, http_error_rate=0.0, http_drop_rate=0.0,
+                 ws_drop_after=None, ws_stall_after=None, cab_change_every=None, seed=None, record=None, verbose=False):
+        self.layouts = layouts; self.layout_index = 0; self.layout = self._copy_layout(layouts[0])
+        self.http_delay = http_delay; self.ws_delay = ws_delay; self.jitter = jitter
+        self.http_error_rate = http_error_rate; self.http_drop_rate = http_drop_rate
+        self.ws_drop_after = ws_drop_after; self.ws_stall_after = ws_stall_after; self.cab_change_every = cab_change_every
+        self.random = random.Random(seed); self.verbose = verbose
+        self.events = []; self.record_file = open(record, 'w', encoding='utf-8') if record else None
+        self.server = None; self.tasks = []; self.started_at = None
+
+    @staticmethod
+    def _copy_layout(layout):
+        return {"commands": list(layout['commands']), "controls": [dict(c) for c in layout['controls']]}
+
+    def record(self, kind, **details):
+        event = {"t": time.time(), "kind": kind, **details}; self.events.append(event)
+        if self.record_file: self.record_file.write(json.dumps(event) + "\n")
+        if self.verbose: print(f"{event['t']:.6f} {kind} {details}")
+        return event
+
+    async def _delay(self, base):
+        delay = base + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0: await asyncio.sleep(delay)
+
+    # --- Cab state ---
+    def _control(self, type_name):
+        for control in self.layout['controls']:
+            if control['TypeName'] == type_name: return control
+        return None
+
+    def _click(self, command):
+        """Move a stepped control one notch if command is one of its step commands"""
+        for control in self.layout['controls']:
+            step_commands = control.get('StepCommands')
+            if not step_commands or command not in step_commands: continue
+            span = control['MaxValue'] - control['MinValue']
+            step = round(control['MinValue'] + control['RangeFraction'] * span) + (1 if command == step_commands[1] else -1)
+            step = min(max(step, control['MinValue']), control['MaxValue'])
+            control['RangeFraction'] = (step - control['MinValue']) / span if span else 0.0
+            return control['TypeName'], step
+        return None
+
+    def cab_controls(self):
+        return [{k: v for k, v in control.items() if k != 'StepCommands'} for control in self.layout['controls']]
+
+    def init_data(self):
+        """switchpanel 'init' payload: rows of cells, each naming its UserCommand"""
+        cells = [{"Definition": {"UserCommand": [command], "Description": str(command), "Type": 0}} for command in self.layout['commands']]
+        return [cells[i:i + 10] for i in range(0, len(cells), 10)]
+
+    async def _cab_changer(self):
+        while True:
+            await asyncio.sleep(self.cab_change_every)
+            self.layout_index = (self.layout_index + 1) % len(self.layouts); self.layout = self._copy_layout(self.layouts[self.layout_index])
+            self.record('cab_change', layout=self.layout_index)
+
+    # --- Connections ---
+    async def start(self, host='localhost', port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        self.started_at = time.time()
+        if self.cab_change_every and len(self.layouts) > 1: self.tasks.append(asyncio.ensure_future(self._cab_changer()))
+        return self.server
+
+    async def stop(self):
+        for task in self.tasks: task.cancel()
+        if self.server: self.server.close(); await self.server.wait_closed()
+        if self.record_file: self.record_file.close(); self.record_file = None
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try: method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError: break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''): break
+                    name, _, value = line.decode('latin-1').partition(':'); headers[name.strip().lower()] = value.strip()
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    await self._websocket(reader, writer, path, headers, peer); break
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                if not await self._http(writer, method, path, body, peer): break
+                if headers.get('connection', '').lower() == 'close': break
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally:
+            writer.close()
+
+    async def _http(self, writer, method, path, body, peer):
+        """Answer one HTTP request. Returns False if the connection should be dropped"""
+        received = self.record('http_' + method.lower(), path=path, peer=str(peer), size=len(body))
+        if self.http_drop_rate and self.random.random() < self.http_drop_rate:
+            self.record('fault', fault='http_drop', of=received['t']); return False
+        await self._delay(self.http_delay)
+        if self.http_error_rate and self.random.random() < self.http_error_rate:
+            self.record('fault', fault='http_error', of=received['t'])
+            await self._respond(writer, 503, {"error": "injected"}); return True
+        if path.split('?', 1)[0].rstrip('/').upper() != '/API/CABCONTROLS':
+            await self._respond(writer, 404, {"error": "not found"}); return True
+        if method == 'GET':
+            await self._respond(writer, 200, self.cab_controls()); return True
+        if method != 'POST':
+            await self._respond(writer, 405, {"error": "method not allowed"}); return True
+        try: items = json.loads(body or b'[]')
+        except ValueError: await self._respond(writer, 400, {"error": "bad json"}); return True
+        for item in items if isinstance(items, list) else [items]:
+            control = self._control(item.get('TypeName'))
+            if control is not None and 'Value' in item: control['RangeFraction'] = min(max(float(item['Value']), 0.0), 1.0)
+            self.record('value', control=item.get('TypeName'), value=item.get('Value'), known=control is not None, received=received['t'])
+        await self._respond(writer, 200, {"result": "ok"}); return True
+
+    async def _respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}.get(status, '')
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    # --- WebSocket (RFC 6455, server side) ---
+    async def _websocket(self, reader, writer, path, headers, peer):
+        if path.split('?', 1)[0].rstrip('/') != '/switchpanel' or 'sec-websocket-key' not in headers:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"); await writer.drain(); return
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest()).decode()
+        protocols = [p.strip() for p in headers.get('sec-websocket-protocol', '').split(',') if p.strip()]
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n" + ("Sec-WebSocket-Protocol: json\r\n" if 'json' in protocols else "") + "\r\n").encode())
+        await writer.drain()
+        connected = self.record('ws_connect', peer=str(peer))['t']; reason = 'closed'
+        try:
+            while True:
+                age = time.time() - connected
+                if self.ws_drop_after is not None and age >= self.ws_drop_after: reason = 'injected drop'; break
+                if self.ws_stall_after is not None and age >= self.ws_stall_after:
+                    # Stop answering anything, pings included, but keep the socket open until the client gives up
+                    self.record('fault', fault='ws_stall', peer=str(peer)); reason = 'injected stall'
+                    while await reader.read(65536): pass
+                    break
+                limits = [t - age for t in (self.ws_drop_after, self.ws_stall_after) if t is not None]
+                try: opcode, payload = await asyncio.wait_for(self._read_message(reader, writer), timeout=min(limits) if limits else None)
+                except asyncio.TimeoutError: continue
+                if opcode == OP_CLOSE: self._write_frame(writer, OP_CLOSE, payload[:2]); await writer.drain(); break
+                if opcode == OP_TEXT: await self._ws_message(writer, payload)
+        except (asyncio.IncompleteReadError, ConnectionError): reason = 'connection lost'
+        self.record('ws_disconnect', peer=str(peer), reason=reason)
+
+    async def _read_message(self, reader, writer):
+        """Next complete data or close message as (opcode, payload). Pings are answered here"""
+        fragments = []; message_opcode = None
+        while True:
+            first, second = await reader.readexactly(2)
+            fin = first & 0x80; opcode = first & 0x0F; length = second & 0x7F
+            if length == 126: length = struct.unpack('!H', await reader.readexactly(2))[0]
+            elif length == 127: length = struct.unpack('!Q', await reader.readexactly(8))[0]
+            if length > MAX_FRAME: raise ConnectionError("frame too large")
+            mask = await reader.readexactly(4) if second & 0x80 else None
+            payload = await reader.readexactly(length)
+            if mask: payload = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+            if opcode == OP_PING: self.record('ws_ping'); self._write_frame(writer, OP_PONG, payload); await writer.drain(); continue
+            if opcode == OP_PONG: continue
+            if opcode == OP_CLOSE: return opcode, payload
+            if opcode != OP_CONT: message_opcode = opcode
+            fragments.append(payload)
+            if fin: return message_opcode, b''.join(fragments)
+
+    def _write_frame(self, writer, opcode, payload):
+        length = len(payload)
+        if length < 126: header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536: header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else: header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        writer.write(header + payload)
+
+    async def _ws_message(self, writer, payload):
+        try: message = json.loads(payload)
+        except ValueError: self.record('ws_bad_message', size=len(payload)); return
+        msg_type = message.get('type') if isinstance(message, dict) else None; data = message.get('data') if msg_type else None
+        received = self.record('ws_' + str(msg_type), data=data)
+        await self._delay(self.ws_delay)
+        if msg_type == 'init':
+            self._write_frame(writer, OP_TEXT, json.dumps({"type": "init", "data": self.init_data()}).encode()); await writer.drain()
+        elif msg_type in ('buttonDown', 'buttonUp'):
+            try: command = int(data)
+            except (TypeError, ValueError): return
+            if command not in self.layout['commands']: self.record('ws_unknown_command', command=command, received=received['t']); return
+            if msg_type == 'buttonDown':
+                moved = self._click(command)
+                if moved: self.record('step', control=moved[0], step=moved[1], received=received['t'])
+
+    # --- Reporting ---
+    def summary(self):
+        counts = {}
+        for event in self.events: counts[event['kind']] = counts.get(event['kind'], 0) + 1
+        elapsed = max(time.time() - (self.started_at or time.time()), 1e-9)
+        lines = [f"Ran {elapsed:.1f}s, {len(self.events)} events"]
+        lines += [f"  {kind:<20} {count:>8}  ({count / elapsed:.1f}/s)" for kind, count in sorted(counts.items())]
+        posts = [e['t'] for e in self.events if e['kind'] == 'http_post']
+        if len(posts) > 1:
+            gaps = sorted(b - a for a, b in zip(posts, posts[1:]))
+            lines.append(f"  POST interval ms: median {gaps[len(gaps) // 2] * 1000:.2f}, p99 {gaps[int(len(gaps) * 0.99)] * 1000:.2f}, max {gaps[-1] * 1000:.2f}")
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Open Rails web server for testing OpenRailsLink without the sim.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--layout", action="append", help=f"Cab layout: {', '.join(BUILTIN_LAYOUTS)} or a JSON file. Repeat to define cabs for --cab-change-every")
+    parser.add_argument("--cab-change-every", type=float, metavar="SEC", help="Switch to the next layout every SEC seconds")
+    parser.add_argument("--http-delay", type=float, default=0.0, metavar="MS", help="Delay before answering each HTTP request")
+    parser.add_argument("--ws-delay", type=float, default=0.0, metavar="MS", help="Delay before handling each WebSocket message")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS", help="Random extra delay, 0..MS, added to each delay")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, metavar="P", help="Fraction of HTTP requests answered with 503")
+    parser.add_argument("--http-drop-rate", type=float, default=0.0, metavar="P", help="Fraction of HTTP requests whose connection is dropped unanswered")
+    parser.add_argument("--ws-drop-after", type=float, metavar="SEC", help="Close each WebSocket abruptly SEC seconds after it connects")
+    parser.add_argument("--ws-stall-after", type=float, metavar="SEC", help="Stop answering each WebSocket (pings included) SEC seconds after it connects")
+    parser.add_argument("--seed", type=int, help="Seed for fault injection and jitter")
+    parser.add_argument("--record", metavar="FILE", help="Write every received event as a JSON line to FILE")
+    parser.add_argument("--dump-layout", action="store_true", help="Print the first layout as JSON and exit")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every event as it arrives")
+    args = parser.parse_args(argv)
+
+    layouts = [load_layout(spec) for spec in (args.layout or ['full'])]
+    if args.dump_layout: print(json.dumps(layouts[0], indent=2)); return
+    server = MockOpenRailsServer(layouts, http_delay=args.http_delay / 1000.0, ws_delay=args.ws_delay / 1000.0, jitter=args.jitter / 1000.0,
+                                 http_error_rate=args.http_error_rate, http_drop_rate=args.http_drop_rate, ws_drop_after=args.ws_drop_after,
+                                 ws_stall_after=args.ws_stall_after, cab_change_every=args.cab_change_every, seed=args.seed,
+                                 record=args.record, verbose=args.verbose)
+
+    async def run():
+        await server.start(args.host, args.port)
+        print(f"Mock Open Rails server on http://{args.host}:{args.port} ({len(layouts)} layout(s), pid {os.getpid()}). Ctrl+C to stop.")
+        try: await asyncio.Event().wait()
+        finally: await server.stop()
+
+    try: asyncio.run(run())
+    except KeyboardInterrupt: pass
+    print(server.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,399 @@
 # web_interface.py
-import asyncio, json, threading, requests, websockets
+import asyncio, heapq, itertools, json, random, threading, time, requests, websockets
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from PyQt5.QtCore import QObject, pyqtSignal
+from definitions import CONTROL_DEFINITIONS, COMMAND_LANES, LANE_BY_STYLE, LANE_OVERRIDES
+
+# Faster JSON codec for the WebSocket path when installed
+try:
+    import orjson
+    json_loads = orjson.loads
+    def json_dumps(obj): return orjson.dumps(obj).decode()
+except ImportError:
+    json_loads = json.loads; json_dumps = json.dumps
+
+DEFAULT_FLUSH_HZ = 60; DEFAULT_FLUSH_DELTA = 0.1
+DEFAULT_VALUE_EPSILON = 0.0005; DEFAULT_VALUE_REFRESH = 0.0  # A value this close to the last one sent is a duplicate, unless the sim took that longer ago than the refresh (s, 0 = never)
+VALUE_RETRY_INTERVAL = 0.5  # How soon values whose POST failed are sent again (s)
+HTTP_WORKERS = 3  # Value flusher, on/off value worker and CABCONTROLS poll each have at most one request out; also the keep-alive pool size
+DEFAULT_CLICK_PRESS_MS = 50; DEFAULT_CLICK_GAP_MS = 20  # buttonDown -> buttonUp, and buttonUp -> next click of the same command
+CAB_POLL_FAST = 0.5; CAB_POLL_MAX = 5.0  # CABCONTROLS poll interval right after a change, and the ceiling it backs off to
+RECONNECT_MIN = 0.05; RECONNECT_MAX = 2.0; RECONNECT_STABLE = 5.0  # Backoff floor and ceiling; a connection that lasted RECONNECT_STABLE resets it
+PING_INTERVAL = 1.0; PING_TIMEOUT = 5.0; CONNECT_TIMEOUT = 3.0  # No pong within PING_TIMEOUT means the sim has stalled
+FLUSH_LATER, FLUSH_NOW, FLUSH_PREEMPT = 0, 1, 2  # How soon queued values must go out: next interval, now, or cutting the current interval short
+HANDSHAKE_RANK = -1; SAFETY_RANK = COMMAND_LANES.index("safety"); DEFAULT_RANK = COMMAND_LANES.index("driving")
+
+class ConnectionStalled(Exception): pass
+
+def cab_controls_signature(server_data):
+    """What the GUI cares about in a CABCONTROLS response: which controls exist and their ranges"""
+    return tuple(sorted((c.get('TypeName'), c.get('MinValue'), c.get('MaxValue')) for c in server_data))
+
+def build_lanes(overrides=None):
+    """Lane rank (index into COMMAND_LANES) per control id and per WebSocket command id.
+
+    overrides maps control ids or styles to lane names and wins over the defaults in
+    definitions. A command id shared by several controls gets the most urgent of their lanes.
+    """
+    overrides = overrides or {}; ranks = {lane: i for i, lane in enumerate(COMMAND_LANES)}
+    control_ranks = {}; command_ranks = {}
+    for control_id, definition in CONTROL_DEFINITIONS.items():
+        style = definition.get('style')
+        lane = overrides.get(control_id) or (None if style is None else overrides.get(style)) or LANE_OVERRIDES.get(control_id) or LANE_BY_STYLE.get(style)
+        rank = control_ranks[control_id] = ranks.get(lane, DEFAULT_RANK)
+        ids = definition.get('id', [])
+        for command_id in ids if isinstance(ids, list) else [ids]: command_ranks[command_id] = min(rank, command_ranks.get(command_id, rank))
+    return control_ranks, command_ranks
+
+class ValueCoalescer:
+    """Latest-value-wins buffer for analog CABCONTROLS values. Only the newest pending value per control is kept,
+    so a fast sweep turns into at most one POST per control per flush instead of one per axis event.
+    On/off values (send_button_value) never come through here: every press and release must reach the sim."""
+    def __init__(self, flush_delta=DEFAULT_FLUSH_DELTA, epsilon=DEFAULT_VALUE_EPSILON, refresh_after=DEFAULT_VALUE_REFRESH):
+        self.flush_delta = flush_delta; self.lock = threading.Lock(); self.pending = {}; self.last_flushed = {}
+        self.epsilon = epsilon; self.refresh_after = refresh_after; self.flushed_at = {}; self.failed = set()
+        self.preempting = frozenset()  # Safety-lane controls: any change to these goes out at once
+    def put(self, control_name, value): return self.put_many({control_name: value})
+    def put_many(self, values):
+        """Queue values atomically and say how soon they must go out (FLUSH_LATER, FLUSH_NOW or FLUSH_PREEMPT).
+        A value goes out without waiting once it moved flush_delta from its last flushed value. Repeats of the
+        last flushed value (within epsilon) are dropped while it is on its way or the sim has it; with refresh_after
+        set, a repeat goes out again once that long has passed since the sim took the value"""
+        with self.lock:
+            urgency = FLUSH_LATER; now = time.monotonic()
+            for control_name, value in values.items():
+                last = self.last_flushed.get(control_name)
+                if (last is not None and abs(value - last) <= self.epsilon and control_name not in self.failed
+                        and (self.refresh_after <= 0 or now - self.flushed_at.get(control_name, now) < self.refresh_after)):
+                    self.pending.pop(control_name, None); continue  # The sim already has it; also drops a queued value it supersedes
+                self.pending[control_name] = value
+                if control_name in self.preempting: urgency = FLUSH_PREEMPT
+                elif urgency == FLUSH_LATER and (last is None or abs(value - last) >= self.flush_delta): urgency = FLUSH_NOW
+            return urgency
+    def take(self):
+        with self.lock: batch = self.pending; self.pending = {}; self.last_flushed.update(batch); self.failed.difference_update(batch)
+        return batch
+    def mark_sent(self, batch, ok):
+        """Record whether the POST of a taken batch reached the sim. Values it did not take are not treated as
+        duplicates when repeated, and requeue_failed() sends them again"""
+        with self.lock:
+            if ok: self.flushed_at.update(dict.fromkeys(batch, time.monotonic()))
+            else: self.failed.update(batch)
+    def requeue_failed(self):
+        """Make values whose last POST failed pending again (newer pending values win); True if any were"""
+        with self.lock:
+            retry = {control_name: self.last_flushed[control_name] for control_name in self.failed if control_name not in self.pending}
+            self.pending.update(retry); return bool(retry)
+    def requeue(self):
+        """Make every flushed value pending again (newer pending values win); True if there is anything to send"""
+        with self.lock: self.pending = {**self.last_flushed, **self.pending}; return bool(self.pending)
 
 class OpenRailsWebInterface(QObject):
     connection_status_changed = pyqtSignal(bool, list); cab_controls_updated = pyqtSignal(list); update_received = pyqtSignal(str); command_sent = pyqtSignal(str, str, str)
+    cab_values_received = pyqtSignal(list)  # Every CABCONTROLS response, for reconciling control positions
     def __init__(self, parent=None):
-        super().__init__(parent); self.port = "2150"; self._websocket = None; self._is_running = False
+        super().__init__(parent); self.port = "2150"; self._websocket = None; self._is_running = False; self.async_loop = None
+        self.coalescer = ValueCoalescer(); self.flush_interval = 1.0 / DEFAULT_FLUSH_HZ; self._flush_handle = None; self._flush_task = None; self._last_flush = 0.0
+        # One keep-alive session for all CABCONTROLS requests; requests stays blocking, so it runs on a small executor off the loop
+        self.session = requests.Session(); self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_WORKERS))
+        self.executor = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="CabControlsHTTP")
+        self._tick_values = None; self._tick_depth = 0  # Values collected inside batch()
+        self._button_values = deque(); self._button_worker = None  # send_button_value() values waiting for their POST, in order
+        self._button_value_controls = frozenset(c for c, d in CONTROL_DEFINITIONS.items() if d['type'] == 'button')
+        self._cab_poll_wakeup = None; self._cab_poll_interval = CAB_POLL_FAST
+        self._ws_subscribers = defaultdict(list); self.subscribe('init', self._on_init_message)
+        # Click trains, keyed (decrease_id, increase_id); a positive count means increase clicks are pending
+        # Per stepped pair, trains asked for (any thread), taken up by a worker and fully sent; see step_clicks_pending()
+        self._click_requests = {}; self._click_absorbed = {}; self._click_done = {}; self._click_lock = threading.Lock()
+        self._click_counts = {}; self._click_workers = {}; self.click_press = DEFAULT_CLICK_PRESS_MS / 1000.0; self.click_gap = DEFAULT_CLICK_GAP_MS / 1000.0
+        self.control_ranks, self.command_ranks = build_lanes(); self.coalescer.preempting = frozenset(c for c, r in self.control_ranks.items() if r == SAFETY_RANK)
+        self._ws_outbox = []; self._ws_seq = itertools.count(); self._ws_outbox_ready = None; self._flush_wakeup = None  # Outbound WebSocket messages, by (rank, seq)
+        self._reconnect_wakeup = None; self._reconnect_now = False; self._down_reported = False
         self.thread = threading.Thread(target=self._run_async_loop, daemon=True)
     def set_port(self, port): self.port = port; self.force_reconnect()
+    def configure_sending(self, flush_hz=DEFAULT_FLUSH_HZ, flush_delta=DEFAULT_FLUSH_DELTA, click_press_ms=DEFAULT_CLICK_PRESS_MS, click_gap_ms=DEFAULT_CLICK_GAP_MS,
+                          value_epsilon=DEFAULT_VALUE_EPSILON, value_refresh_s=DEFAULT_VALUE_REFRESH):
+        self.flush_interval = 1.0 / max(float(flush_hz), 1.0); self.coalescer.flush_delta = float(flush_delta)
+        self.coalescer.epsilon = max(float(value_epsilon), 0.0); self.coalescer.refresh_after = max(float(value_refresh_s), 0.0)
+        self.click_press = max(float(click_press_ms), 0.0) / 1000.0; self.click_gap = max(float(click_gap_ms), 0.0) / 1000.0
+    def configure_lanes(self, overrides):
+        """Remap controls or styles to priority lanes, e.g. {"camera": "driving", "HORN": "driving"}"""
+        self.control_ranks, self.command_ranks = build_lanes(overrides); self.coalescer.preempting = frozenset(c for c, r in self.control_ranks.items() if r == SAFETY_RANK)
     def start(self):
         if not self._is_running: self._is_running = True; self.thread.start()
     def stop(self):
         if self._is_running:
             self._is_running = False
+            # Whatever is still pending is the resting position of a control: it must reach the sim
+            batch = self.coalescer.take()
+            if batch: self._post_values([{"TypeName": control_name, "Value": value} for control_name, value in batch.items()])
+            if self.async_loop is not None and self._reconnect_wakeup is not None: self.async_loop.call_soon_threadsafe(self._reconnect_wakeup.set)
             if self._websocket: asyncio.run_coroutine_threadsafe(self._websocket.close(), self.async_loop)
-            self.thread.join(timeout=2)
+            self.thread.join(timeout=2); self.executor.shutdown(wait=False); self.session.close()
     def _run_async_loop(self):
         self.async_loop = asyncio.new_event_loop(); asyncio.set_event_loop(self.async_loop)
+        self._cab_poll_wakeup = asyncio.Event(); self._reconnect_wakeup = asyncio.Event()
+        self._ws_outbox_ready = asyncio.Event(); self._flush_wakeup = asyncio.Event()
+        self.async_loop.call_soon(self._request_flush, FLUSH_NOW)  # Values set before the loop existed
         self.async_loop.run_until_complete(self._connection_handler())
     async def _poll_cab_controls(self):
-        while self._websocket and self._is_running:
+        # Emits only when the set of controls or their ranges change. Polls fast after a change or
+        # reconnect and backs off while the cab stays the same; poll_cab_controls_soon() cuts a wait short
+        last_signature = None; self._cab_poll_interval = CAB_POLL_FAST
+        while self._is_running:
+            self._cab_poll_wakeup.clear()  # Before the GET: a wake-up during it (e.g. a click train ending) means read again at once
             try:
-                response = await asyncio.to_thread(requests.get, f"http://localhost:{self.port}/API/CABCONTROLS", timeout=2)
-                response.raise_for_status(); self.cab_controls_updated.emit(response.json())
-            except requests.exceptions.RequestException: pass
-            await asyncio.sleep(2)
+                response = await self.async_loop.run_in_executor(self.executor, lambda: self.session.get(f"http://localhost:{self.port}/API/CABCONTROLS", timeout=2))
+                response.raise_for_status(); server_data = response.json(); signature = cab_controls_signature(server_data); self.cab_values_received.emit(server_data)
+                if signature != last_signature: last_signature = signature; self._cab_poll_interval = CAB_POLL_FAST; self.cab_controls_updated.emit(server_data)
+                else: self._cab_poll_interval = min(self._cab_poll_interval * 2, CAB_POLL_MAX)
+            except (requests.exceptions.RequestException, ValueError): self._cab_poll_interval = CAB_POLL_FAST
+            try: await asyncio.wait_for(self._cab_poll_wakeup.wait(), self._cab_poll_interval)
+            except asyncio.TimeoutError: pass
+
+    def poll_cab_controls_soon(self):
+        """Re-check CABCONTROLS now and poll fast for a while, e.g. when the cab may have changed"""
+        if self.async_loop is not None and self._cab_poll_wakeup is not None: self.async_loop.call_soon_threadsafe(self._wake_cab_poll)
+
+    def _wake_cab_poll(self):
+        self._cab_poll_interval = CAB_POLL_FAST; self._cab_poll_wakeup.set()
     async def _connection_handler(self):
+        # Connect -> serve -> (lost) -> back off -> connect ..., until stop() is called.
+        # The first retry after losing a connection comes within RECONNECT_MIN; repeated failures back off
+        # exponentially, with jitter, up to RECONNECT_MAX. force_reconnect() skips the wait
+        attempt = 0
         while self._is_running:
-            uri = f"ws://localhost:{self.port}/switchpanel"
+            self._reconnect_wakeup.clear(); connected_at = None; error = "Connection closed."
             try:
-                async with websockets.connect(uri, subprotocols=["json"]) as websocket:
-                    self._websocket = websocket; asyncio.create_task(self._poll_cab_controls()); await self._send_ws_message("init", "")
-                    async for message in websocket:
-                        data = json.loads(message)
-                        if data.get('type') == 'init':
-                            init_data = data.get('data', [])
-                            active_ids = {cell['Definition']['UserCommand'][0] for row in init_data for cell in row if 'Definition' in cell and 'UserCommand' in cell['Definition']}
-                            self.connection_status_changed.emit(True, list(active_ids))
-                        self.update_received.emit(json.dumps(data))
-            except Exception as e:
-                if self._websocket is not None: self._websocket = None; self.cab_controls_updated.emit([]) 
-                self.connection_status_changed.emit(False, [str(e)])
-            if self._is_running: await asyncio.sleep(2)
-
-    async def _send_ws_message(self, msg_type, data):
-        if self._websocket: message = json.dumps({"type": msg_type, "data": data}); await self._websocket.send(message)
+                async with websockets.connect(f"ws://localhost:{self.port}/switchpanel", subprotocols=["json"], open_timeout=CONNECT_TIMEOUT, ping_interval=None, close_timeout=0.5) as websocket:
+                    connected_at = self.async_loop.time()
+                    if not self._reconnect_now: await self._run_connection(websocket)  # Asked to reconnect (e.g. new port) while connecting
+            except Exception as e: error = str(e) or type(e).__name__
+            self._end_connection()
+            if not self._is_running: break
+            # Report a lost connection once, not every failed retry
+            if connected_at is not None or not self._down_reported: self._down_reported = True; self.connection_status_changed.emit(False, [error])
+            if connected_at is not None and self.async_loop.time() - connected_at >= RECONNECT_STABLE: attempt = 0
+            if self._reconnect_now: self._reconnect_now = False; attempt = 0; continue
+            delay = min(RECONNECT_MAX, RECONNECT_MIN * 2 ** attempt); attempt += 1
+            try: await asyncio.wait_for(self._reconnect_wakeup.wait(), random.uniform(delay / 2, delay))
+            except asyncio.TimeoutError: pass
+            if self._reconnect_now: self._reconnect_now = False; attempt = 0
+
+    async def _run_connection(self, websocket):
+        """Serve one connection until it closes or stalls. Its tasks (receiver, pinger, CABCONTROLS poller, value retries) end with it"""
+        self._websocket = websocket; self._down_reported = False
+        self._send_ws_message("init", "", HANDSHAKE_RANK)
+        if self.coalescer.requeue(): self._request_flush(FLUSH_NOW)  # The sim may have been reloaded: restore every value it last got from us
+        tasks = [self.async_loop.create_task(coro) for coro in (self._receive_messages(websocket), self._send_ws_outbox(websocket), self._watch_pings(websocket), self._poll_cab_controls(), self._retry_failed_values())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done: task.result()  # Re-raise whatever ended the connection
+        finally:
+            for task in tasks: task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _receive_messages(self, websocket):
+        async for message in websocket: self._dispatch_ws_message(message)
+
+    async def _watch_pings(self, websocket):
+        # websockets' own keepalive is disabled so a stalled sim is noticed in seconds rather than tens of seconds
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            pong = await websocket.ping()
+            try: await asyncio.wait_for(pong, PING_TIMEOUT)
+            except asyncio.TimeoutError: raise ConnectionStalled(f"No reply to ping within {PING_TIMEOUT:.0f} s")
+
+    def _end_connection(self):
+        # Pending clicks are dropped rather than replayed: after reconnecting, CABCONTROLS reports where the steps really are
+        for worker in self._click_workers.values(): worker.cancel()
+        for key in self._click_workers: self._finish_clicks(key)
+        self._click_workers.clear(); self._click_counts.clear()
+        for _, _, _, sent in self._ws_outbox: sent.cancel()
+        self._ws_outbox.clear()
+        if self._websocket is not None: self._websocket = None; self.cab_controls_updated.emit([])
+
+    def subscribe(self, msg_type, callback):
+        """Call callback(data, raw_text) on async_loop for every WebSocket message of msg_type ('*' for all)"""
+        self._ws_subscribers[msg_type].append(callback)
+
+    def _dispatch_ws_message(self, message):
+        # Each frame is parsed once; subscribers get the parsed object, the log gets the original text
+        data = json_loads(message); msg_type = data.get('type') if isinstance(data, dict) else None
+        for callback in self._ws_subscribers.get(msg_type, []) + self._ws_subscribers.get('*', []): callback(data, message)
+        self.update_received.emit(message if isinstance(message, str) else message.decode(errors='replace'))
+
+    def _on_init_message(self, data, raw_text):
+        init_data = data.get('data', [])
+        active_ids = {cell['Definition']['UserCommand'][0] for row in init_data for cell in row if 'Definition' in cell and 'UserCommand' in cell['Definition']}
+        self.connection_status_changed.emit(True, list(active_ids)); self.poll_cab_controls_soon()
+
+    def _send_ws_message(self, msg_type, data, rank=None):
+        # Runs on async_loop. Queues the message behind anything more urgent; await the returned future to know it was written
+        sent = self.async_loop.create_future()
+        if not self._websocket: sent.set_result(None); return sent
+        if rank is None: rank = self._command_rank(data)
+        heapq.heappush(self._ws_outbox, (rank, next(self._ws_seq), json_dumps({"type": msg_type, "data": data}), sent)); self._ws_outbox_ready.set()
+        return sent
+
+    def _command_rank(self, command_id):
+        # Some controls send a list of ids as one command (HANDBRAKE [184, 185]); it gets the most urgent of their lanes
+        if isinstance(command_id, list): return min((self.command_ranks.get(c, DEFAULT_RANK) for c in command_id), default=DEFAULT_RANK)
+        return self.command_ranks.get(command_id, DEFAULT_RANK)
+
+    async def _send_ws_outbox(self, websocket):
+        # The only writer to the socket, so a safety command queued behind a burst of camera clicks or a click train goes out next
+        while True:
+            await self._ws_outbox_ready.wait()
+            while self._ws_outbox:
+                _, _, message, sent = heapq.heappop(self._ws_outbox)
+                await websocket.send(message)
+                if not sent.done(): sent.set_result(None)
+            self._ws_outbox_ready.clear()
     
     def force_reconnect(self):
-        if self._websocket: asyncio.run_coroutine_threadsafe(self._websocket.close(), self.async_loop)
+        """Drop the current connection, if any, and reconnect at once without waiting out the backoff"""
+        if self.async_loop is not None and self._reconnect_wakeup is not None: self.async_loop.call_soon_threadsafe(self._reconnect_immediately)
+
+    def _reconnect_immediately(self):
+        self._reconnect_now = True; self._reconnect_wakeup.set()
+        if self._websocket: self.async_loop.create_task(self._websocket.close())
         
     def send_button_event(self, command_id, event_type):
         self.command_sent.emit("WS", str(command_id), event_type)
-        if self._websocket: asyncio.run_coroutine_threadsafe(self._send_ws_message(event_type, command_id), self.async_loop)
+        if self._websocket: self.async_loop.call_soon_threadsafe(self._send_ws_message, event_type, command_id)
         
-    async def _send_click_coro(self, command_id):
-        await self._send_ws_message("buttonDown", command_id)
-        await asyncio.sleep(0.05)
-        await self._send_ws_message("buttonUp", command_id)
-
     def send_ws_click(self, command_id):
-        self.command_sent.emit("WS", str(command_id), "CLICK")
-        if self._websocket:
-            asyncio.run_coroutine_threadsafe(self._send_click_coro(command_id), self.async_loop)
+        self._queue_clicks(None, command_id, 1)
+
+    def send_step_clicks(self, decrease_id, increase_id, delta):
+        """Queue delta clicks on a stepped control (negative = decrease). Opposite pending clicks cancel out"""
+        if delta: self._queue_clicks(decrease_id, increase_id, delta)
+
+    def step_clicks_pending(self, decrease_id, increase_id):
+        """True while clicks queued on this stepped control have not all been sent. Safe from any thread"""
+        key = self._click_key(decrease_id, increase_id)
+        return self._click_requests.get(key, 0) > self._click_done.get(key, 0)
+
+    @staticmethod
+    def _click_key(decrease_id, increase_id):
+        return tuple(c if not isinstance(c, list) else tuple(c) for c in (decrease_id, increase_id))
+
+    def _queue_clicks(self, decrease_id, increase_id, delta):
+        if not self._websocket: return
+        if decrease_id is not None:
+            key = self._click_key(decrease_id, increase_id)
+            with self._click_lock: self._click_requests[key] = self._click_requests.get(key, 0) + 1
+        self.async_loop.call_soon_threadsafe(self._add_clicks, decrease_id, increase_id, delta)
+
+    def _add_clicks(self, decrease_id, increase_id, delta):
+        # Runs on async_loop. One worker per command pair sends its clicks strictly one after another
+        key = self._click_key(decrease_id, increase_id)
+        if decrease_id is not None: self._click_absorbed[key] = self._click_absorbed.get(key, 0) + 1
+        self._click_counts[key] = self._click_counts.get(key, 0) + delta
+        worker = self._click_workers.get(key)
+        if worker is None or worker.done(): self._click_workers[key] = self.async_loop.create_task(self._run_clicks(key, decrease_id, increase_id))
+
+    async def _run_clicks(self, key, decrease_id, increase_id):
+        try:
+            while self._click_counts.get(key):
+                count = self._click_counts[key]; command_id = increase_id if count > 0 else decrease_id
+                self._click_counts[key] = count - 1 if count > 0 else count + 1
+                self.command_sent.emit("WS", str(command_id), "CLICK")
+                await self._send_ws_message("buttonDown", command_id); await asyncio.sleep(self.click_press)
+                await self._send_ws_message("buttonUp", command_id)
+                if self._click_counts.get(key): await asyncio.sleep(self.click_gap)
+        finally:
+            # Also after a failure, so the next click on this pair starts a fresh worker instead of piling onto a dead one
+            if self._click_workers.get(key) is asyncio.current_task():
+                self._click_workers.pop(key); self._click_counts.pop(key, None); self._finish_clicks(key)
+        if decrease_id is not None: self._wake_cab_poll()  # A stepped control: confirm which step it ended up on
+
+    def _finish_clicks(self, key):
+        # Every train a worker took up is now sent (or dropped), so step_clicks_pending() lets the next CABCONTROLS reading through
+        if key in self._click_absorbed: self._click_done[key] = self._click_absorbed[key]
             
     def send_control_value(self, control_name, value):
-        self.command_sent.emit("HTTP", control_name, f"{value:.4f}")
-        payload = [{"TypeName": control_name, "Value": value}];
-        try: requests.post(f"http://localhost:{self.port}/API/CABCONTROLS", json=payload, timeout=0.5)
-        except requests.exceptions.RequestException: pass
\ No newline at end of file
+        """Fire-and-forget: returns at once, the value goes out with the next flush on async_loop. For analog
+        controls only; on/off controls are passed on to send_button_value so no press or release is lost"""
+        if control_name in self._button_value_controls: self.send_button_value(control_name, value); return
+        if self._tick_values is not None: self._tick_values[control_name] = value; return
+        self._schedule_flush(self.coalescer.put(control_name, value))
+
+    def send_button_value(self, control_name, value):
+        """Fire-and-forget for on/off controls sent as values (HORN, BELL). Unlike send_control_value every value
+        goes out, one POST each and in order, so a press and release inside one poll both reach the sim"""
+        if self.async_loop is not None and self._is_running: self.async_loop.call_soon_threadsafe(self._queue_button_value, control_name, value)
+
+    def _queue_button_value(self, control_name, value):
+        # Runs on async_loop. One worker posts them one after another, so a release never overtakes its press
+        self._button_values.append((control_name, value))
+        if self._button_worker is None or self._button_worker.done(): self._button_worker = self.async_loop.create_task(self._send_button_values())
+
+    async def _send_button_values(self):
+        while self._button_values:
+            control_name, value = self._button_values.popleft()
+            await self._post_values_async([{"TypeName": control_name, "Value": value}])
+
+    @contextmanager
+    def batch(self):
+        """Hold back the analog values sent by one dispatch tick so they reach the coalescer, and the sim, together.
+        Only the last value per control is kept, so on/off values are never held here"""
+        self._tick_depth += 1
+        if self._tick_depth == 1: self._tick_values = {}
+        try: yield
+        finally:
+            self._tick_depth -= 1
+            if self._tick_depth == 0:
+                values = self._tick_values; self._tick_values = None
+                if values: self._schedule_flush(self.coalescer.put_many(values))
+
+    def _schedule_flush(self, urgent):
+        # Until the loop runs values just stay pending; the loop flushes them on start
+        if self.async_loop is not None and self._is_running: self.async_loop.call_soon_threadsafe(self._request_flush, urgent)
+
+    async def _post_values_async(self, payload):
+        return await self.async_loop.run_in_executor(self.executor, self._post_values, payload)
+
+    def _post_values(self, payload):
+        """POST the values; True if the sim accepted them"""
+        for item in payload: self.command_sent.emit("HTTP", item["TypeName"], f"{item['Value']:.4f}")
+        try: return self.session.post(f"http://localhost:{self.port}/API/CABCONTROLS", json=payload, timeout=0.5).ok
+        except requests.exceptions.RequestException: return False
+
+    async def _retry_failed_values(self):
+        # Only values whose POST failed go out again: a value the sim took is never resent unasked, so
+        # there is no idle traffic and a change the driver makes in the sim itself is not overwritten
+        while True:
+            await asyncio.sleep(VALUE_RETRY_INTERVAL)
+            if self.coalescer.requeue_failed(): self._request_flush(FLUSH_LATER)
+
+    def _request_flush(self, urgent):
+        # Runs on async_loop. A running flush picks up new values itself once its interval is over, or at once for safety values
+        if self._flush_task and not self._flush_task.done():
+            if urgent == FLUSH_PREEMPT: self._flush_wakeup.set()
+            return
+        if self._flush_handle:
+            if not urgent: return
+            self._flush_handle.cancel()
+        delay = 0.0 if urgent else max(0.0, self._last_flush + self.flush_interval - self.async_loop.time())
+        self._flush_handle = self.async_loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None; self._flush_task = self.async_loop.create_task(self._flush_values())
+
+    async def _flush_values(self):
+        while True:
+            self._flush_wakeup.clear()  # Before the POST, so a preempting value that arrives during it cuts the wait below short
+            batch = self.coalescer.take()
+            if not batch: return
+            self._last_flush = self.async_loop.time()
+            # Safety-lane values lead the POST so the sim applies them first
+            items = sorted(batch.items(), key=lambda item: self.control_ranks.get(item[0], DEFAULT_RANK))
+            self.coalescer.mark_sent(batch, await self._post_values_async([{"TypeName": control_name, "Value": value} for control_name, value in items]))
+            # Values that arrived meanwhile wait out the rest of the interval, then go out as the final flush
+            try: await asyncio.wait_for(self._flush_wakeup.wait(), max(0.0, self._last_flush + self.flush_interval - self.async_loop.time()))
+            except asyncio.TimeoutError: pass
\ No newline at end of file